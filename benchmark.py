@@ -0,0 +1,340 @@
+"""
+Benchmarks for the transliteration hot paths.
+
+Generates a reproducible synthetic corpus (Tatyshly Latin, Tatyshly
+Cyrillic and Beserman text, plus sample ELAN and CSV files), measures
+throughput and latency of the main functions and saves the results
+as JSON. Run it from the repository folder, e.g.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+from udmurt_translit import UdmurtTransliterator
+
+
+# Sentences the synthetic corpus is built from
+seedTexts = {
+    'tatyshly_lat': [
+        "no uˀmort s'äin polnost'ju kə̑ljosə̑z vala.",
+        "van' odiˀ vnuke.",
+        "jen pitra.",
+        "nə̑lə̑, baˀǯ'ə̑ŋez, d'iana.",
+        "nə̑lə̑lə̑ ku̯amə̑n ares.",
+        "nə̑lə̑ uže magn'itə̑n d'irektor lu̇sa.",
+        "kuzpale, karte mə̑nam uža das ku̇n' ar uže sverlovskə̑n.",
+        "van'ze verasa bə̑dti mon tileˀlə̑, van' istori asles'tə̑m.",
+        "otə̑n al'i uks'o tə̑ro ke no, užas's'os tə̑ros jevə̑l ni.",
+        "užaj školajə̑n ku̯amə̑n ar, biologi= biologija no ximija nu̇i.",
+        "i udmurtjos kazanskij xanstvolen udmurtjosə̑z lu̇em bere ǯ'u̇č'josə̑n gožto dogovor."
+    ],
+    'tatyshly_cyr': [
+        "одик пол иммӓр ас дораз тылобурдоосъз ӧ⁰т'ътэм.",
+        "со вӱэн мис'тӓс'кэм но сӹбӹрэ гӹнэ иммӓр доръ мънэм.",
+        "— тон ачит вӱ шӧттид-а ма? — шӱэм но иммӓр, пэззъкэз шур доръ лэз'ъмтэ ни.",
+        "тӥн'и сойин кўака вӱо интъйън, пэ, улэ, а пэззък ўан' гӱмӹрзэ вӱ уччаса орччътэ."
+    ],
+    'beserman': [
+        'walʼlʼo no soje tuləs pɤžʼtəlizə, štobɨ gužem užan dərja.... marəmen...'
+    ]
+}
+
+
+def make_corpus(rng, src, nWords):
+    """
+    Build a list of sentences with about nWords words in the given script.
+    Half of the words come from the seed sentences (frequent words repeat,
+    as in real texts), the other half are new words spliced from two
+    seed words.
+    """
+    vocab = []
+    for text in seedTexts[src]:
+        vocab += [part for part in UdmurtTransliterator.rxWords.findall(text.lower())
+                  if any(c.isalpha() for c in part)]
+    sentences = []
+    nTotal = 0
+    while nTotal < nWords:
+        words = []
+        for i in range(rng.randint(3, 12)):
+            if rng.random() < 0.5:
+                words.append(vocab[min(int(rng.paretovariate(1.2)) - 1, len(vocab) - 1)])
+            else:
+                w1, w2 = rng.choice(vocab), rng.choice(vocab)
+                words.append(w1[:rng.randint(1, len(w1))] + w2[rng.randint(0, len(w2) - 1):])
+            if rng.random() < 0.15:
+                words[-1] += ','
+        if rng.random() < 0.05:
+            words.append('(nrzb)')
+        sentences.append(' '.join(words) + rng.choice(['.', '.', '?', '...']))
+        nTotal += len(words)
+    return sentences
+
+
+def write_eaf(fname, sentences):
+    """
+    Write an ELAN file with one transcription tier.
+    """
+    from xml.sax.saxutils import escape, quoteattr
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<ANNOTATION_DOCUMENT AUTHOR="" DATE="2020-01-01T00:00:00+03:00" FORMAT="3.0" VERSION="3.0"'
+             ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+             ' xsi:noNamespaceSchemaLocation="http://www.mpi.nl/tools/elan/EAFv3.0.xsd">',
+             '    <HEADER MEDIA_FILE="" TIME_UNITS="milliseconds">',
+             '        <PROPERTY NAME="lastUsedAnnotationId">' + str(len(sentences)) + '</PROPERTY>',
+             '    </HEADER>',
+             '    <TIME_ORDER>']
+    for i in range(2 * len(sentences)):
+        lines.append('        <TIME_SLOT TIME_SLOT_ID="ts' + str(i + 1) + '" TIME_VALUE="' + str(i * 1000) + '"/>')
+    lines += ['    </TIME_ORDER>',
+              '    <TIER LINGUISTIC_TYPE_REF="transcription" PARTICIPANT="SP" TIER_ID="tx@SP">']
+    for i, sentence in enumerate(sentences):
+        lines += ['        <ANNOTATION>',
+                  '            <ALIGNABLE_ANNOTATION ANNOTATION_ID=' + quoteattr('a' + str(i + 1))
+                  + ' TIME_SLOT_REF1="ts' + str(2 * i + 1) + '" TIME_SLOT_REF2="ts' + str(2 * i + 2) + '">',
+                  '                <ANNOTATION_VALUE>' + escape(sentence) + '</ANNOTATION_VALUE>',
+                  '            </ALIGNABLE_ANNOTATION>',
+                  '        </ANNOTATION>']
+    lines += ['    </TIER>',
+              '    <LINGUISTIC_TYPE GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="transcription"'
+              ' TIME_ALIGNABLE="true"/>',
+              '</ANNOTATION_DOCUMENT>']
+    with open(fname, 'w', encoding='utf-8') as fOut:
+        fOut.write('\n'.join(lines) + '\n')
+
+
+def write_csv(fname, sentences):
+    """
+    Write a TSV file with an empty target column and a source column.
+    """
+    with open(fname, 'w', encoding='utf-8') as fOut:
+        fOut.write('standard\ttranscription\n')
+        for sentence in sentences:
+            fOut.write('\t' + sentence + '\n')
+
+
+def count_words(text):
+    return sum(1 for part in UdmurtTransliterator.rxWords.findall(text)
+               if any(c.isalpha() for c in part))
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if len(values) <= 0:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values) + 0.5)) - 1))]
+
+
+def measure(name, func, items, nWords):
+    """
+    Call func on each of the items and return the statistics:
+    total time, words per second and latency percentiles.
+    """
+    latencies = []
+    startTotal = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - startTotal
+    latencies.sort()
+    result = {
+        'calls': len(items),
+        'words': nWords,
+        'seconds': round(total, 4),
+        'wordsPerSec': round(nWords / total, 1) if total > 0 else 0.0,
+        'p50Ms': round(percentile(latencies, 50) * 1000, 4),
+        'p90Ms': round(percentile(latencies, 90) * 1000, 4),
+        'p99Ms': round(percentile(latencies, 99) * 1000, 4),
+        'maxMs': round(latencies[-1] * 1000, 4) if len(latencies) > 0 else 0.0
+    }
+    print(name + ': ' + str(result['wordsPerSec']) + ' words/s, p50 ' + str(result['p50Ms'])
+          + ' ms, p99 ' + str(result['p99Ms']) + ' ms')
+    return result
+
+
+def new_transliterator(src):
+    # Caches are switched off, so that every call does the whole work,
+    # and options are ranked deterministically, so that runs are comparable
+    return UdmurtTransliterator(src=src, target='standard', eafCleanup=True,
+                                wordCacheSize=0, segmentCacheSize=0,
+                                ranking='deterministic')
+
+
+def run_benchmarks(nWords, seed, workDir, nFileRuns):
+    results = {}
+    rng = random.Random(seed)
+    corpus = {src: make_corpus(rng, src, nWords) for src in seedTexts}
+
+    for src in ('tatyshly_lat', 'tatyshly_cyr'):
+        translit = new_transliterator(src)
+        translit.warmup()
+        texts = corpus[src]
+        results['transliterate/' + src] = measure('transliterate/' + src, translit.transliterate,
+                                                  texts, sum(count_words(text) for text in texts))
+
+        words = sorted(set(part for text in texts for part in translit.split_text(text, True)
+                           if any(c.isalpha() for c in part)))
+        if src == 'tatyshly_cyr':
+            wordsSrc = [translit.transliterate_word_cyrtrans_upa(word) for word in words]
+        else:
+            wordsSrc = words
+        translit = new_transliterator(src)
+        translit.warmup()
+        results['transliterate_word_tatyshly_standard/' + src] = measure(
+            'transliterate_word_tatyshly_standard/' + src,
+            translit.transliterate_word_tatyshly_standard, wordsSrc, len(wordsSrc))
+
+        # The ambiguity expansion alone (the stages that call expand_variants)
+        wordsCyr = [translit.tatyshly_to_cyr(word) for word in wordsSrc
+                    if translit.rxCyrillic.search(word) is None]
+
+        def expand(word):
+            wordVariants = {word: 0}
+            for stage in translit.variantStages:
+                wordVariants = getattr(translit, stage[0])(wordVariants)
+            return wordVariants
+        results['expand_variants/' + src] = measure('expand_variants/' + src, expand,
+                                                    wordsCyr, len(wordsCyr))
+
+        # pick_best on precomputed options, with a fresh analyzer cache
+        candidates = [translit.candidates_tatyshly_standard(word) for word in wordsSrc]
+        translit = new_transliterator(src)
+        translit.warmup()
+        results['pick_best/' + src] = measure('pick_best/' + src,
+                                              lambda c: translit.pick_best(list(c), c),
+                                              candidates, len(candidates))
+
+    translit = new_transliterator('tatyshly_lat')
+    texts = corpus['beserman']
+    results['beserman_translit_cyrillic'] = measure('beserman_translit_cyrillic',
+                                                    translit.beserman_translit_cyrillic,
+                                                    texts, sum(count_words(text) for text in texts))
+
+    fnameEaf = os.path.join(workDir, 'sample.eaf')
+    write_eaf(fnameEaf, corpus['tatyshly_lat'])
+    try:
+        from lxml import etree
+        from transliterate_eafs import EafProcessor
+    except ImportError as err:
+        print('EafProcessor.transliterate skipped: ' + str(err))
+        results['EafProcessor.transliterate'] = {'skipped': str(err)}
+    else:
+        translit = UdmurtTransliterator(src='tatyshly_lat', target='standard', eafCleanup=True,
+                                        ranking='deterministic')
+        translit.warmup()
+        ep = EafProcessor(translit, 'transcription')
+
+        def process_eaf(fname):
+            translit.clear_cache()
+            ep.eafTree = etree.parse(fname)
+            ep.lastID = len(corpus['tatyshly_lat']) + 1
+            ep.transliterate()
+        results['EafProcessor.transliterate'] = measure(
+            'EafProcessor.transliterate', process_eaf, [fnameEaf] * nFileRuns,
+            nFileRuns * sum(count_words(text) for text in corpus['tatyshly_lat']))
+
+    fnameCsv = os.path.join(workDir, 'sample.tsv')
+    write_csv(fnameCsv, corpus['tatyshly_cyr'])
+    try:
+        from transliterate_csv import CsvProcessor
+    except ImportError as err:
+        print('CsvProcessor.process_file skipped: ' + str(err))
+        results['CsvProcessor.process_file'] = {'skipped': str(err)}
+    else:
+        translit = UdmurtTransliterator(src='tatyshly_cyr', target='standard', eafCleanup=True,
+                                        ranking='deterministic')
+        translit.warmup()
+        cp = CsvProcessor(translit, sep='\t', srcCol=1, tgtCol=0, startLine=1)
+
+        def process_csv(fname):
+            translit.clear_cache()
+            cp.process_file(fname, fname + '.out')
+        results['CsvProcessor.process_file'] = measure(
+            'CsvProcessor.process_file', process_csv, [fnameCsv] * nFileRuns,
+            nFileRuns * sum(count_words(text) for text in corpus['tatyshly_cyr']))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the throughput of each benchmark relative to the baseline
+    and return the names of the benchmarks that became slower
+    by more than threshold (a fraction).
+    """
+    regressions = []
+    print('\n{:<55} {:>12} {:>12} {:>8}'.format('benchmark', 'words/s', 'baseline', 'ratio'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or 'wordsPerSec' not in result or 'wordsPerSec' not in base:
+            continue
+        ratio = result['wordsPerSec'] / base['wordsPerSec'] if base['wordsPerSec'] > 0 else 0.0
+        print('{:<55} {:>12} {:>12} {:>8.2f}'.format(name, result['wordsPerSec'],
+                                                     base['wordsPerSec'], ratio))
+        if ratio < 1 - threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Udmurt transliterator.')
+    parser.add_argument('--words', type=int, default=3000,
+                        help='approximate number of words per script in the synthetic corpus')
+    parser.add_argument('--seed', type=int, default=1, help='random seed of the corpus')
+    parser.add_argument('--file-runs', type=int, default=3,
+                        help='how many times the ELAN and CSV samples are processed')
+    parser.add_argument('--output', default='', help='JSON file to save the results to')
+    parser.add_argument('--baseline', default='', help='JSON file with earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown relative to the baseline reported as a regression')
+    parser.add_argument('--keep-files', default='',
+                        help='folder to keep the generated ELAN and CSV samples in')
+    args = parser.parse_args()
+
+    workDir = args.keep_files
+    if len(workDir) > 0:
+        os.makedirs(workDir, exist_ok=True)
+    else:
+        workDir = tempfile.mkdtemp(prefix='translit_bench_')
+    try:
+        results = run_benchmarks(args.words, args.seed, workDir, args.file_runs)
+    finally:
+        if len(args.keep_files) <= 0:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'words': args.words,
+            'seed': args.seed,
+            'fileRuns': args.file_runs
+        },
+        'results': results
+    }
+    if len(args.output) > 0:
+        with open(args.output, 'w', encoding='utf-8') as fOut:
+            json.dump(report, fOut, ensure_ascii=False, indent=2)
+    if len(args.baseline) > 0:
+        with open(args.baseline, 'r', encoding='utf-8') as fIn:
+            baseline = json.load(fIn)
+        if baseline['meta'].get('words') != args.words or baseline['meta'].get('seed') != args.seed:
+            print('Warning: the baseline was made with a different corpus.')
+        regressions = compare(results, baseline['results'], args.threshold)
+        if len(regressions) > 0:
+            print('Slower than the baseline: ' + ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
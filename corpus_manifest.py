@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+
+
+def file_hash(fname):
+    """
+    Return the SHA-256 hash of a file's contents.
+    """
+    h = hashlib.sha256()
+    with open(fname, 'rb') as fIn:
+        for chunk in iter(lambda: fIn.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def output_args(initArgs):
+    """
+    Return the transliterator constructor arguments
+    that can affect its output.
+    """
+    return {k: v for k, v in initArgs.items()
+            if not k.endswith(('CacheSize', 'CacheDir'))
+            and k not in ('collectStats', 'lexiconDir')}
+
+
+# Modules the transliteration of a word depends on
+translitModules = ('udmurt_translit.py', 'translit_tables.py',
+                   'freq_store.py', 'freq_index.py', 'verdict_store.py')
+
+
+def code_hashes(extraModules=()):
+    """
+    Return the hashes of the modules that can affect the output
+    (translitModules and extraModules), {file name: hash}.
+    """
+    codeDir = os.path.dirname(os.path.abspath(__file__))
+    codeFiles = sorted(set(translitModules) | set(extraModules))
+    return {fname: file_hash(os.path.join(codeDir, fname)) for fname in codeFiles}
+
+
+def data_hashes():
+    """
+    Return the hashes of the files in the data folder, {path: hash}.
+    """
+    dataFiles = []
+    for root, dirs, files in os.walk('data'):
+        dataFiles += [os.path.join(root, fname) for fname in files]
+    return {fname: file_hash(fname) for fname in sorted(dataFiles)}
+
+
+def corpus_settings(transliterator, processorSettings, processorModule):
+    """
+    Collect everything that the output of a corpus run depends on,
+    apart from the input files: transliterator and processor settings,
+    the analyzer version and the hashes of the data files and the code
+    (the transliterator modules and processorModule,
+    e.g. 'transliterate_eafs.py').
+    """
+    return {
+        'transliterator': output_args(transliterator.initArgs),
+        'processor': processorSettings,
+        'analyzer': transliterator.analyzer_version(),
+        'data': data_hashes(),
+        'code': code_hashes([processorModule])
+    }
+
+
+class CorpusManifest:
+    """
+    Record of the files processed in earlier runs, stored in
+    the output folder. For each input file, it keeps the hash of
+    its contents and the hash of the settings it was processed with,
+    so that files whose output is up to date can be skipped.
+    """
+    fname = '.translit_manifest.json'
+
+    def __init__(self, outDir, settings):
+        self.path = os.path.join(outDir, self.fname)
+        self.settingsHash = hashlib.sha256(json.dumps(settings, sort_keys=True,
+                                                      ensure_ascii=False).encode('utf-8')).hexdigest()
+        self.entries = {}       # {input file: {'input': hash, 'size': ..., 'mtime': ..., ...}}
+        self.current = {}       # {input file: current entry without the settings}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as fIn:
+                    self.entries = json.load(fIn)['files']
+            except (ValueError, KeyError):
+                print('The manifest ' + self.path + ' could not be read, all files will be processed.')
+
+    def input_entry(self, fnameIn):
+        """
+        Describe the current state of an input file. The file is only
+        hashed if its size or modification time has changed.
+        """
+        st = os.stat(fnameIn)
+        entry = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+        oldEntry = self.entries.get(fnameIn)
+        if (oldEntry is not None and oldEntry.get('size') == entry['size']
+                and oldEntry.get('mtime') == entry['mtime']):
+            entry['input'] = oldEntry['input']
+        else:
+            entry['input'] = file_hash(fnameIn)
+        self.current[fnameIn] = entry
+        return entry
+
+    def is_up_to_date(self, fnameIn, fnameOut):
+        """
+        Check if fnameOut was produced from the current version
+        of fnameIn with the current settings.
+        """
+        entry = self.input_entry(fnameIn)
+        oldEntry = self.entries.get(fnameIn)
+        return (oldEntry is not None
+                and oldEntry['input'] == entry['input']
+                and oldEntry.get('settings') == self.settingsHash
+                and oldEntry.get('output') == fnameOut
+                and os.path.exists(fnameOut))
+
+    def mark_done(self, fnameIn, fnameOut):
+        entry = self.current.get(fnameIn)
+        if entry is None:
+            entry = self.input_entry(fnameIn)
+        entry['settings'] = self.settingsHash
+        entry['output'] = fnameOut
+        self.entries[fnameIn] = entry
+
+    def save(self, fnamesIn=None):
+        """
+        Write the manifest. If fnamesIn is given, forget
+        the files that are not in it.
+        """
+        if fnamesIn is not None:
+            fnamesIn = set(fnamesIn)
+            self.entries = {fname: entry for fname, entry in self.entries.items()
+                            if fname in fnamesIn}
+        fnameTmp = self.path + '.tmp'
+        with open(fnameTmp, 'w', encoding='utf-8') as fOut:
+            json.dump({'files': self.entries}, fOut, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(fnameTmp, self.path)
@@ -0,0 +1,53 @@
+import bisect
+
+
+class FreqPrefixIndex:
+    """
+    Prefix index over a frequency dictionary. The words are kept
+    in one sorted list, which works as a compact trie: all words
+    starting with a given prefix form a contiguous range in it.
+    freqDict can also be a FreqStore, whose words are already sorted.
+    """
+    def __init__(self, freqDict):
+        self.freqDict = freqDict
+        if hasattr(freqDict, 'sorted_words'):
+            self.words = freqDict.sorted_words()
+            self.freqs = freqDict.freqs
+        else:
+            self.words = sorted(freqDict)
+            self.freqs = [freqDict[word] for word in self.words]
+
+    def __len__(self):
+        return len(self.words)
+
+    def prefix_range(self, prefix):
+        """
+        Return (start, end) indices of the words that start with prefix.
+        """
+        iStart = bisect.bisect_left(self.words, prefix)
+        if len(prefix) <= 0:
+            return iStart, len(self.words)
+        nextPrefix = prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10FFFF))
+        iEnd = bisect.bisect_left(self.words, nextPrefix, lo=iStart)
+        return iStart, iEnd
+
+    def has_prefix(self, prefix):
+        """
+        Return True iff at least one word starts with prefix.
+        """
+        i = bisect.bisect_left(self.words, prefix)
+        return i < len(self.words) and self.words[i].startswith(prefix)
+
+    def max_freq(self, prefix, maxScan=256):
+        """
+        Return the highest frequency of a word starting with prefix,
+        or 0 if there are none. Only the first maxScan words are looked at,
+        so for short prefixes the value is an approximation.
+        """
+        iStart, iEnd = self.prefix_range(prefix)
+        maxFreq = 0
+        for i in range(iStart, min(iEnd, iStart + maxScan)):
+            curFreq = self.freqs[i]
+            if curFreq > maxFreq:
+                maxFreq = curFreq
+        return maxFreq
@@ -0,0 +1,160 @@
+import sys
+import os
+import json
+import mmap
+import struct
+from array import array
+
+
+class SortedKeys:
+    """
+    Read-only sequence view of the keys of a FreqStore
+    in sorted order. Works with bisect.
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.store)
+        if i < 0 or i >= len(self.store):
+            raise IndexError(i)
+        key = self.store.blob[self.store.offsets[i]:self.store.offsets[i + 1]]
+        return str(key, 'utf-8', errors='surrogatepass')
+
+
+class FreqStore:
+    """
+    Frequency dictionary compiled into a binary file and read
+    through mmap, so that all processes that open the same file
+    share one copy of it. The words are stored sorted by their
+    UTF-8 encoding, which is the same as sorting the strings,
+    and looked up by binary search. Supports the read-only
+    part of the dict interface.
+
+    File layout (native byte order, all sections 8-byte aligned):
+    magic, number of words n, size of the key data, type of the
+    frequencies ('q' for integers, 'd' for floats), n + 1 offsets
+    of the keys in the key data, n frequencies, key data.
+    """
+    magic = b'UDFREQ01'
+    header = struct.Struct('=8sQQc7x')
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as fIn:
+            self.mm = mmap.mmap(fIn.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, blobSize, freqType = self.header.unpack_from(self.mm, 0)
+        if magic != self.magic:
+            raise ValueError(fname + ' is not a compiled frequency list'
+                             ' or was compiled on a machine with another byte order.')
+        self.n = n
+        self.buf = memoryview(self.mm)
+        buf = self.buf
+        pos = self.header.size
+        self.offsets = buf[pos:pos + 8 * (n + 1)].cast('Q')
+        pos += 8 * (n + 1)
+        self.freqs = buf[pos:pos + 8 * n].cast(freqType.decode('ascii'))
+        pos += 8 * n
+        self.blobStart = pos
+        self.blob = buf[pos:pos + blobSize]
+
+    def __len__(self):
+        return self.n
+
+    def index(self, word):
+        """
+        Return the position of the word in the sorted key list, or -1.
+        """
+        try:
+            key = word.encode('utf-8', errors='surrogatepass')
+        except AttributeError:
+            return -1
+        mm, offsets, blobStart = self.mm, self.offsets, self.blobStart
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            midKey = mm[blobStart + offsets[mid]:blobStart + offsets[mid + 1]]
+            if midKey < key:
+                lo = mid + 1
+            elif midKey > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def __getitem__(self, word):
+        i = self.index(word)
+        if i < 0:
+            raise KeyError(word)
+        return self.freqs[i]
+
+    def get(self, word, default=None):
+        i = self.index(word)
+        if i < 0:
+            return default
+        return self.freqs[i]
+
+    def sorted_words(self):
+        return SortedKeys(self)
+
+    def __iter__(self):
+        return iter(self.sorted_words())
+
+    def keys(self):
+        return self.sorted_words()
+
+    def items(self):
+        return zip(self.sorted_words(), self.freqs)
+
+    def close(self):
+        self.offsets.release()
+        self.freqs.release()
+        self.blob.release()
+        self.buf.release()
+        self.mm.close()
+
+
+def compile_freq_list(fnameJson, fnameOut):
+    """
+    Convert a JSON frequency list {word: frequency}
+    into the binary format read by FreqStore.
+    """
+    with open(fnameJson, 'r', encoding='utf-8') as fIn:
+        freqDict = json.load(fIn)
+    keys = sorted(freqDict)
+    freqType = 'q'
+    if not all(type(freqDict[k]) == int for k in keys):
+        freqType = 'd'
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for k in keys:
+        blob += k.encode('utf-8', errors='surrogatepass')
+        offsets.append(len(blob))
+    freqs = array(freqType, (freqDict[k] for k in keys))
+    fnameTmp = fnameOut + '.tmp'
+    with open(fnameTmp, 'wb') as fOut:
+        fOut.write(FreqStore.header.pack(FreqStore.magic, len(keys), len(blob),
+                                         freqType.encode('ascii')))
+        fOut.write(offsets.tobytes())
+        fOut.write(freqs.tobytes())
+        fOut.write(blob)
+    os.replace(fnameTmp, fnameOut)
+    return len(keys)
+
+
+if __name__ == '__main__':
+    fnameJson = 'data/std_freq_dict.json'
+    fnameOut = 'data/std_freq_dict.bin'
+    if len(sys.argv) > 1:
+        fnameJson = sys.argv[1]
+    if len(sys.argv) > 2:
+        fnameOut = sys.argv[2]
+    nWords = compile_freq_list(fnameJson, fnameOut)
+    print(str(nWords) + ' words written to ' + fnameOut + '.')
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded mapping with least-recently-used eviction
+    and hit/miss counters. Can be used from several threads.
+    """
+    def __init__(self, maxSize=10000):
+        self.maxSize = maxSize      # 0 disables the cache, negative values mean no limit
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """
+        Return the value stored for key, or default if there is none.
+        Update the usage order and the counters.
+        """
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store the value, evicting the least recently used
+        items if the cache is full.
+        """
+        if self.maxSize == 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if self.maxSize > 0:
+                while len(self.data) > self.maxSize:
+                    self.data.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all items and reset the counters.
+        """
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return a dictionary with the cache size and hit/miss counters.
+        """
+        with self.lock:
+            nRequests = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'maxSize': self.maxSize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / nRequests if nRequests > 0 else 0.0
+            }
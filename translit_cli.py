@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import json
+import argparse
+from itertools import islice
+from collections import deque
+from udmurt_translit import UdmurtTransliterator
+from translit_pool import transliterate_batches
+
+
+def read_lines(fnames):
+    """
+    Iterate over the lines of the files (stdin for '-') as tuples
+    (text, line ending), so that the line endings can be kept.
+    """
+    for fname in fnames:
+        if fname == '-':
+            fIn = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            fIn = open(fname, 'r', encoding='utf-8-sig', newline='')
+        try:
+            for line in fIn:
+                text = line.rstrip('\r\n')
+                yield text, line[len(text):]
+        finally:
+            if fname == '-':
+                fIn.detach()
+            else:
+                fIn.close()
+
+
+def read_batches(lines, batchSize):
+    """
+    Group the lines into lists of at most batchSize lines.
+    """
+    while True:
+        batch = list(islice(lines, batchSize))
+        if len(batch) <= 0:
+            return
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transliterate text line by line. '
+                                                 'The output is written in the order of the input '
+                                                 'as soon as each batch of lines is ready.')
+    parser.add_argument('files', nargs='*', default=['-'],
+                        help='input files, - for stdin (default)')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout (default)')
+    parser.add_argument('--src', default='tatyshly_lat',
+                        help='source writing system: tatyshly_lat or tatyshly_cyr')
+    parser.add_argument('--target', default='standard')
+    parser.add_argument('--eaf-cleanup', action='store_true',
+                        help='clean up spaces and dots, capitalize sentences and proper names')
+    parser.add_argument('--batch-size', type=int, default=1000, help='lines transliterated at once')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--ranking', default='deterministic', help='random or deterministic')
+    parser.add_argument('--search-mode', default='exhaustive', help='exhaustive or prefix')
+    parser.add_argument('--max-variants', type=int, default=0)
+    parser.add_argument('--verdict-cache-dir',
+                        help='folder for the persistent cache of analyzer verdicts')
+    parser.add_argument('--lexicon-dir', default='lexicon',
+                        help='folder with compiled lexicons (see translit_lexicon.py)')
+    parser.add_argument('--stats', help='collect statistics and write them to this JSON file')
+    args = parser.parse_args()
+
+    # Messages printed by the transliterator go to stderr,
+    # so that stdout only contains the output
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    transliterator = UdmurtTransliterator(src=args.src, target=args.target,
+                                          eafCleanup=args.eaf_cleanup,
+                                          ranking=args.ranking,
+                                          searchMode=args.search_mode,
+                                          maxVariants=args.max_variants,
+                                          verdictCacheDir=args.verdict_cache_dir,
+                                          lexiconDir=args.lexicon_dir,
+                                          collectStats=args.stats is not None)
+    if args.workers <= 1:
+        transliterator.warmup()
+    if args.output == '-':
+        fOut = io.TextIOWrapper(stdout.buffer, encoding='utf-8', newline='')
+    else:
+        fOut = open(args.output, 'w', encoding='utf-8', newline='')
+
+    batches = read_batches(read_lines(args.files), args.batch_size)
+    # Line endings stay in the main process, only the texts are sent to the workers
+    endings = deque()
+
+    def texts(batches):
+        for batch in batches:
+            endings.append([ending for text, ending in batch])
+            yield [text for text, ending in batch]
+
+    try:
+        for results in transliterate_batches(transliterator, texts(batches),
+                                             nWorkers=args.workers, quietStdout=True):
+            batchEndings = endings.popleft()
+            fOut.write(''.join(result + ending for result, ending in zip(results, batchEndings)))
+            fOut.flush()
+    except BrokenPipeError:
+        # The reader has stopped (e.g. head); the rest of the output
+        # is discarded so that flushing it at exit does not fail
+        os.dup2(os.open(os.devnull, os.O_WRONLY), stdout.fileno())
+        return
+    finally:
+        transliterator.close()
+    fOut.close()
+    if args.stats is not None:
+        with open(args.stats, 'w', encoding='utf-8') as fStats:
+            json.dump(transliterator.get_stats(), fStats, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
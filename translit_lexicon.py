@@ -0,0 +1,186 @@
+import os
+import json
+import gzip
+import hashlib
+import argparse
+from collections import Counter
+from corpus_manifest import output_args, code_hashes, data_hashes
+
+
+def lexicon_fname(lexiconDir, src, target, eafCleanup):
+    return os.path.join(lexiconDir, src + '-' + target
+                        + ('-cleanup' if eafCleanup else '') + '.json.gz')
+
+
+def rules_version(transliterator):
+    """
+    Return a hash of everything the transliteration of a word
+    depends on apart from the direction: output-related constructor
+    arguments, the analyzer version, the data files and the code.
+    """
+    initArgs = output_args(transliterator.initArgs)
+    for k in ('src', 'target', 'eafCleanup'):
+        del initArgs[k]
+    settings = {
+        'transliterator': initArgs,
+        'analyzer': transliterator.analyzer_version(),
+        'data': data_hashes(),
+        'code': code_hashes()
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True,
+                                     ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def lexicon_version(rulesVersion, src, target, eafCleanup):
+    return hashlib.sha256(json.dumps([rulesVersion, src, target, eafCleanup]).encode('utf-8')).hexdigest()
+
+
+def load_lexicons(transliterator, lexiconDir):
+    """
+    Read the lexicons compiled for the current version of the rules
+    and data (see compile_lexicon) from lexiconDir. Return a dictionary
+    {(src, target, eafCleanup): {word: transliteration}}.
+    Outdated lexicons are ignored. Lexicons are only used with
+    the deterministic ranking (see compile_lexicon).
+    """
+    lexicons = {}
+    if lexiconDir is None or not os.path.isdir(lexiconDir):
+        return lexicons
+    if transliterator.ranking != 'deterministic':
+        if any(fname.endswith('.json.gz') for fname in os.listdir(lexiconDir)):
+            print('The lexicons in ' + lexiconDir + ' will not be used: they require '
+                  'ranking=\'deterministic\'.')
+        return lexicons
+    rulesVersion = None
+    for fname in sorted(os.listdir(lexiconDir)):
+        if not fname.endswith('.json.gz'):
+            continue
+        with gzip.open(os.path.join(lexiconDir, fname), 'rt', encoding='utf-8') as fIn:
+            lexicon = json.load(fIn)
+        if rulesVersion is None:
+            rulesVersion = rules_version(transliterator)
+        direction = (lexicon['src'], lexicon['target'], lexicon['eafCleanup'])
+        if lexicon['version'] != lexicon_version(rulesVersion, *direction):
+            print('The lexicon ' + fname + ' was compiled for other rules or settings and will not be used.')
+            continue
+        lexicons[direction] = lexicon['words']
+    return lexicons
+
+
+def compile_lexicon(transliterator, words, lexiconDir, src='', target='', eafCleanup=None,
+                    batchSize=10000):
+    """
+    Transliterate words with the full pipeline and write the results
+    to lexiconDir. The transliterator should not use a lexicon itself
+    and should use the deterministic ranking: with the random one,
+    the choices made for one run would be fixed in the lexicon.
+    Return the name of the file.
+    """
+    if transliterator.ranking != 'deterministic':
+        raise ValueError('Lexicons can only be compiled with ranking=\'deterministic\', '
+                         'not \'' + str(transliterator.ranking) + '\'.')
+    if len(src) <= 0:
+        src = transliterator.src
+    if len(target) <= 0:
+        target = transliterator.target
+    if eafCleanup is None:
+        eafCleanup = transliterator.eafCleanup
+    words = sorted(set(words))
+    wordsTranslit = {}
+    for i in range(0, len(words), batchSize):
+        wordsTranslit.update(transliterator.transliterate_words(words[i:i + batchSize], src=src,
+                                                                target=target, eafCleanup=eafCleanup))
+    lexicon = {
+        'src': src,
+        'target': target,
+        'eafCleanup': eafCleanup,
+        'version': lexicon_version(rules_version(transliterator), src, target, eafCleanup),
+        'words': wordsTranslit
+    }
+    if not os.path.exists(lexiconDir):
+        os.makedirs(lexiconDir)
+    fname = lexicon_fname(lexiconDir, src, target, eafCleanup)
+    fnameTmp = fname + '.tmp'
+    with gzip.open(fnameTmp, 'wt', encoding='utf-8') as fOut:
+        json.dump(lexicon, fOut, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    os.replace(fnameTmp, fname)
+    return fname
+
+
+def corpus_texts(paths, tiers, sep, srcCol):
+    """
+    Iterate over the texts that would be transliterated
+    in the ELAN, CSV/TSV/XLSX/XLS and plain text files
+    found in paths (files or folders).
+    """
+    from transliterate_eafs import EafProcessor
+    from transliterate_csv import CsvProcessor
+    eafProcessor = EafProcessor(None, tiers)
+    csvProcessor = CsvProcessor(None, sep=sep, srcCol=srcCol)
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                fnames += [os.path.join(root, fname) for fname in sorted(files)]
+        else:
+            fnames.append(path)
+    for fname in fnames:
+        if fname.lower().endswith('.eaf'):
+            yield from eafProcessor.source_texts(fname)
+        elif fname.lower().endswith(('.csv', '.tsv', '.xlsx', '.xls')):
+            yield from csvProcessor.source_texts(fname)
+        elif fname.lower().endswith('.txt'):
+            with open(fname, 'r', encoding='utf-8-sig') as fIn:
+                for line in fIn:
+                    yield line.strip()
+
+
+def main():
+    from udmurt_translit import UdmurtTransliterator
+    parser = argparse.ArgumentParser(description='Compile the transliterations of known words '
+                                                 'into a lookup table used by UdmurtTransliterator.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compileParser = subparsers.add_parser('compile', help='transliterate the vocabulary of a corpus '
+                                                          'and write the lexicon')
+    compileParser.add_argument('paths', nargs='+',
+                               help='ELAN, CSV/TSV/XLSX/XLS or plain text files (one text per line), '
+                                    'or folders with them')
+    compileParser.add_argument('--src', default='tatyshly_lat')
+    compileParser.add_argument('--target', default='standard')
+    compileParser.add_argument('--eaf-cleanup', action='store_true')
+    compileParser.add_argument('--tiers', default='transcription',
+                               help='regex for names or types of ELAN tiers to be transliterated')
+    compileParser.add_argument('--sep', default='\t', help='CSV separator')
+    compileParser.add_argument('--src-col', type=int, default=0, help='CSV source column')
+    compileParser.add_argument('--min-count', type=int, default=1,
+                               help='only include words that occur at least this many times')
+    compileParser.add_argument('--lexicon-dir', default='lexicon')
+    infoParser = subparsers.add_parser('info', help='list the lexicons and check if they are up to date')
+    infoParser.add_argument('--lexicon-dir', default='lexicon')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        transliterator = UdmurtTransliterator('', '', ranking='deterministic', lexiconDir=None)
+        lexicons = load_lexicons(transliterator, args.lexicon_dir)
+        for (src, target, eafCleanup), words in lexicons.items():
+            print(src + ' -> ' + target + (' (cleanup)' if eafCleanup else '') + ': '
+                  + str(len(words)) + ' words')
+        if len(lexicons) <= 0:
+            print('No up-to-date lexicons in ' + args.lexicon_dir + '.')
+        return
+
+    transliterator = UdmurtTransliterator(src=args.src, target=args.target,
+                                          eafCleanup=args.eaf_cleanup,
+                                          ranking='deterministic', lexiconDir=None)
+    wordCounts = Counter()
+    for text in corpus_texts(args.paths, args.tiers, args.sep, args.src_col):
+        wordCounts.update(transliterator.split_text(text, args.eaf_cleanup))
+    words = [word for word, count in wordCounts.items() if count >= args.min_count]
+    print(str(len(words)) + ' words out of ' + str(len(wordCounts)) + ' will be transliterated.')
+    transliterator.warmup()
+    fname = compile_lexicon(transliterator, words, args.lexicon_dir)
+    print('Lexicon written to ' + fname + '.')
+
+
+if __name__ == '__main__':
+    main()
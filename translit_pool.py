@@ -0,0 +1,126 @@
+import sys
+import copy
+from collections import deque
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+from udmurt_translit import UdmurtTransliterator
+
+
+workerProcessor = None      # Processor of the current worker process
+workerTransliterator = None # Transliterator of the current worker process (batch mode)
+
+
+def init_worker(processor, translitArgs):
+    """
+    Build the transliterator of a worker process once
+    and load everything it needs.
+    """
+    global workerProcessor
+    processor.transliterator = UdmurtTransliterator(**translitArgs)
+    processor.transliterator.warmup()
+    workerProcessor = processor
+
+
+def run_task(processor, fnameIn, fnameOut):
+    """
+    Process one file. Return a tuple (fnameIn, error message),
+    where the message is None if there were no errors.
+    """
+    try:
+        processor.process_file(fnameIn, fnameOut)
+    except Exception as err:
+        return fnameIn, repr(err)
+    return fnameIn, None
+
+
+def thread_task(processor, fnameIn, fnameOut):
+    """
+    Process one file in a worker thread with a copy of the processor,
+    which keeps the state of the file, and the shared transliterator.
+    """
+    threadProcessor = copy.copy(processor)
+    threadProcessor.transliterator = processor.transliterator
+    return run_task(threadProcessor, fnameIn, fnameOut)
+
+
+def worker_task(task):
+    """
+    Process one file in a worker process. The statistics collected
+    while processing it (if any) are returned along with the result.
+    """
+    fnameIn, error = run_task(workerProcessor, *task)
+    return fnameIn, error, workerProcessor.transliterator.pop_stats()
+
+
+def process_files(processor, tasks, nWorkers=1, threads=False):
+    """
+    Process files with processor.process_file(fnameIn, fnameOut), where
+    tasks is a list of (fnameIn, fnameOut) tuples. If nWorkers > 1, do it
+    in a pool of nWorkers processes, each with its own transliterator,
+    or, if threads is True, in a pool of nWorkers threads that share
+    processor.transliterator (this saves memory and helps if reading
+    and writing the files takes much time).
+    Yield (fnameIn, error message) tuples in the order of tasks.
+    The statistics of the workers are added to those of
+    processor.transliterator.
+    """
+    if nWorkers <= 1:
+        for fnameIn, fnameOut in tasks:
+            yield run_task(processor, fnameIn, fnameOut)
+        return
+    if threads:
+        with ThreadPoolExecutor(nWorkers) as executor:
+            futures = [executor.submit(thread_task, processor, fnameIn, fnameOut)
+                       for fnameIn, fnameOut in tasks]
+            for future in futures:
+                yield future.result()
+        return
+    with Pool(nWorkers, initializer=init_worker,
+              initargs=(processor, processor.transliterator.initArgs)) as pool:
+        for fnameIn, error, stats in pool.imap(worker_task, tasks):
+            processor.transliterator.merge_stats(stats)
+            yield fnameIn, error
+
+
+def init_batch_worker(translitArgs, quietStdout):
+    """
+    Build the transliterator of a worker process for transliterate_batches.
+    If quietStdout is True, the messages printed by the transliterator
+    go to stderr.
+    """
+    global workerTransliterator
+    if quietStdout:
+        sys.stdout = sys.stderr
+    workerTransliterator = UdmurtTransliterator(**translitArgs)
+    workerTransliterator.warmup()
+
+
+def batch_task(texts):
+    return workerTransliterator.transliterate_many(texts), workerTransliterator.pop_stats()
+
+
+def transliterate_batches(transliterator, batches, nWorkers=1, quietStdout=False):
+    """
+    Transliterate an iterable of lists of texts. Yield the lists
+    of transliterations in the same order. If nWorkers > 1, the batches
+    are distributed among nWorkers processes with transliterators
+    built like the given one; at most 2 * nWorkers batches are read
+    ahead, so that the input does not have to fit into memory.
+    """
+    if nWorkers <= 1:
+        for texts in batches:
+            yield transliterator.transliterate_many(texts)
+        return
+    with Pool(nWorkers, initializer=init_batch_worker,
+              initargs=(transliterator.initArgs, quietStdout)) as pool:
+        pending = deque()
+        for texts in batches:
+            pending.append(pool.apply_async(batch_task, (texts,)))
+            if len(pending) >= 2 * nWorkers:
+                results, stats = pending.popleft().get()
+                transliterator.merge_stats(stats)
+                yield results
+        while len(pending) > 0:
+            results, stats = pending.popleft().get()
+            transliterator.merge_stats(stats)
+            yield results
@@ -0,0 +1,283 @@
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from udmurt_translit import UdmurtTransliterator
+
+
+class DirectionWorker:
+    """
+    One warm transliterator for a (src, target) pair. Requests
+    that arrive within batchWindow seconds of each other are
+    collected into one batch; each distinct text of the batch
+    is transliterated once. The transliterator runs in its own
+    thread, so that the server keeps answering other requests.
+    """
+    def __init__(self, src, target, translitArgs, batchWindow=0.005, maxBatchSize=5000):
+        self.src = src
+        self.target = target
+        self.transliterator = UdmurtTransliterator(src, target, **translitArgs)
+        self.transliterator.warmup()
+        self.batchWindow = batchWindow
+        self.maxBatchSize = maxBatchSize    # Texts per batch
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = {}       # {eafCleanup: [(texts, future), ...]}
+        self.pendingSize = {}   # {eafCleanup: number of texts}
+        self.flushHandles = {}  # {eafCleanup: scheduled flush}
+        self.nRequests = 0
+        self.nBatches = 0
+        self.nTexts = 0
+        self.nDistinctTexts = 0
+        self.busyTime = 0.0
+
+    def transliterate(self, texts, eafCleanup):
+        """
+        Add texts to the current batch. Return a future
+        that receives the list of their transliterations.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.nRequests += 1
+        if eafCleanup not in self.pending:
+            self.pending[eafCleanup] = []
+            self.pendingSize[eafCleanup] = 0
+            self.flushHandles[eafCleanup] = loop.call_later(self.batchWindow, self.flush, eafCleanup)
+        self.pending[eafCleanup].append((texts, future))
+        self.pendingSize[eafCleanup] += len(texts)
+        if self.pendingSize[eafCleanup] >= self.maxBatchSize:
+            self.flushHandles[eafCleanup].cancel()
+            self.flush(eafCleanup)
+        return future
+
+    def flush(self, eafCleanup):
+        requests = self.pending.pop(eafCleanup)
+        del self.pendingSize[eafCleanup]
+        del self.flushHandles[eafCleanup]
+        asyncio.ensure_future(self.run_batch(requests, eafCleanup))
+
+    async def run_batch(self, requests, eafCleanup):
+        texts = list({text: True for requestTexts, future in requests for text in requestTexts})
+        self.nBatches += 1
+        self.nTexts += sum(len(requestTexts) for requestTexts, future in requests)
+        self.nDistinctTexts += len(texts)
+        startTime = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.transliterate_batch, texts, eafCleanup)
+        except Exception as err:
+            for requestTexts, future in requests:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        finally:
+            self.busyTime += time.perf_counter() - startTime
+        for requestTexts, future in requests:
+            if not future.done():
+                future.set_result([results[text] for text in requestTexts])
+
+    def transliterate_batch(self, texts, eafCleanup):
+        return dict(zip(texts, self.transliterator.transliterate_many(texts, eafCleanup=eafCleanup)))
+
+    def stats(self):
+        """
+        Return the counters of the worker and its transliterator.
+        Should be run in self.executor, so that the transliterator
+        is not used at the same time.
+        """
+        return {
+            'requests': self.nRequests,
+            'batches': self.nBatches,
+            'texts': self.nTexts,
+            'distinctTexts': self.nDistinctTexts,
+            'busySeconds': round(self.busyTime, 6),
+            'caches': self.transliterator.cache_stats(),
+            'translit': self.transliterator.get_stats()
+        }
+
+    def close(self):
+        self.executor.shutdown()
+        self.transliterator.close()
+
+
+class TranslitServer:
+    """
+    Minimal HTTP/JSON server that keeps one warm transliterator
+    for each direction. Endpoints:
+    - POST /transliterate with {"texts": [...]} or {"text": "..."},
+      and optionally "src", "target" and "eafCleanup";
+      returns {"texts": [...]} or {"text": "..."};
+    - GET /health;
+    - GET /stats.
+    """
+    maxBodySize = 16 * 1024 * 1024
+    statusNames = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                   405: 'Method Not Allowed', 413: 'Payload Too Large',
+                   500: 'Internal Server Error'}
+
+    def __init__(self, directions, translitArgs=None, batchWindow=0.005, maxBatchSize=5000):
+        if translitArgs is None:
+            translitArgs = {}
+        self.workers = {}       # {(src, target): DirectionWorker}
+        for src, target in directions:
+            self.workers[(src, target)] = DirectionWorker(src, target, translitArgs,
+                                                          batchWindow=batchWindow,
+                                                          maxBatchSize=maxBatchSize)
+        self.defaultDirection = directions[0]
+        self.startTime = time.time()
+        self.nConnections = 0
+        self.nErrors = 0
+
+    async def handle_connection(self, reader, writer):
+        self.nConnections += 1
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if len(requestLine) <= 0:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = requestLine.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, {'error': 'Malformed request line.'}, False)
+                    break
+                method, path, version = parts
+                keepAlive = (headers.get('connection', '').lower() != 'close'
+                             and version != 'HTTP/1.0')
+                bodySize = headers.get('content-length', '0')
+                if not bodySize.isdecimal():
+                    await self.respond(writer, 400, {'error': 'Malformed Content-Length.'}, False)
+                    break
+                bodySize = int(bodySize)
+                if bodySize > self.maxBodySize:
+                    await self.respond(writer, 413, {'error': 'Request too large.'}, False)
+                    break
+                body = await reader.readexactly(bodySize) if bodySize > 0 else b''
+                status, response = await self.dispatch(method, path.split('?')[0], body)
+                await self.respond(writer, status, response, keepAlive)
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, response, keepAlive):
+        if status != 200:
+            self.nErrors += 1
+        body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        head = ('HTTP/1.1 ' + str(status) + ' ' + self.statusNames[status] + '\r\n'
+                + 'Content-Type: application/json; charset=utf-8\r\n'
+                + 'Content-Length: ' + str(len(body)) + '\r\n'
+                + 'Connection: ' + ('keep-alive' if keepAlive else 'close') + '\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        """
+        Return (HTTP status, response dictionary) for a request.
+        """
+        if path == '/health':
+            return 200, {'status': 'ok',
+                         'directions': [src + '-' + target for src, target in self.workers]}
+        elif path == '/stats':
+            return 200, await self.stats()
+        elif path != '/transliterate':
+            return 404, {'error': 'Unknown path: ' + path}
+        if method != 'POST':
+            return 405, {'error': 'Use POST for /transliterate.'}
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'The request body is not valid JSON.'}
+        if not isinstance(request, dict):
+            return 400, {'error': 'The request should be a JSON object.'}
+        direction = (request.get('src', self.defaultDirection[0]),
+                     request.get('target', self.defaultDirection[1]))
+        if not all(isinstance(value, str) for value in direction):
+            return 400, {'error': '"src" and "target" should be strings.'}
+        if direction not in self.workers:
+            return 400, {'error': 'Direction not served: ' + direction[0] + '-' + direction[1]}
+        worker = self.workers[direction]
+        eafCleanup = request.get('eafCleanup', worker.transliterator.eafCleanup)
+        if not isinstance(eafCleanup, bool):
+            return 400, {'error': '"eafCleanup" should be true or false.'}
+        if 'texts' in request:
+            texts = request['texts']
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                return 400, {'error': '"texts" should be a list of strings.'}
+            try:
+                return 200, {'texts': await worker.transliterate(texts, eafCleanup)}
+            except Exception as err:
+                return 500, {'error': repr(err)}
+        elif isinstance(request.get('text'), str):
+            try:
+                return 200, {'text': (await worker.transliterate([request['text']], eafCleanup))[0]}
+            except Exception as err:
+                return 500, {'error': repr(err)}
+        return 400, {'error': 'The request should contain "texts" or "text".'}
+
+    async def stats(self):
+        loop = asyncio.get_running_loop()
+        directions = {}
+        for (src, target), worker in self.workers.items():
+            directions[src + '-' + target] = await loop.run_in_executor(worker.executor, worker.stats)
+        return {
+            'uptime': round(time.time() - self.startTime, 3),
+            'connections': self.nConnections,
+            'errors': self.nErrors,
+            'directions': directions
+        }
+
+    async def serve(self, host='127.0.0.1', port=8765, unixSocket=None):
+        if unixSocket is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unixSocket)
+            print('Listening on ' + unixSocket + '.')
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print('Listening on http://' + host + ':' + str(port) + '.')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in self.workers.values():
+                worker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve transliteration requests over HTTP/JSON.')
+    parser.add_argument('--direction', action='append',
+                        help='src-target pair to serve, e.g. tatyshly_lat-standard '
+                             '(can be repeated; the first one is the default)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='listen on a Unix socket instead of a TCP port')
+    parser.add_argument('--eaf-cleanup', action='store_true')
+    parser.add_argument('--ranking', default='deterministic')
+    parser.add_argument('--batch-window', type=float, default=5,
+                        help='milliseconds to wait for more requests before transliterating a batch')
+    parser.add_argument('--max-batch', type=int, default=5000,
+                        help='texts per batch')
+    parser.add_argument('--collect-stats', action='store_true')
+    args = parser.parse_args()
+    directions = args.direction
+    if directions is None:
+        directions = ['tatyshly_lat-standard', 'tatyshly_cyr-standard']
+    directions = [tuple(direction.split('-', 1)) for direction in directions]
+    translitArgs = {'eafCleanup': args.eaf_cleanup, 'ranking': args.ranking,
+                    'collectStats': args.collect_stats}
+    server = TranslitServer(directions, translitArgs,
+                            batchWindow=args.batch_window / 1000, maxBatchSize=args.max_batch)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import time
+import json
+import heapq
+import threading
+
+
+class TranslitStats:
+    """
+    Counters and timings collected by UdmurtTransliterator
+    if it is created with collectStats=True:
+    - cumulative time and number of calls for each stage;
+    - number of variants generated per word (histogram with
+      power-of-two buckets, and the maximum);
+    - number of analyzer calls and words sent to the analyzer;
+    - nSlowest words that took the longest to transliterate.
+    The stages are: expansion (of ambiguous letters), normalization,
+    cyr_replacements, freq_lookup (frequency lookups and ranking
+    of the options), analyzer and verdict_store. The time of a word
+    does not include the analyzer calls made for many words at once.
+    The counters can be updated from several threads.
+    """
+    analyzerStages = ('analyzer', 'verdict_store')
+
+    def __init__(self, nSlowest=20):
+        self.nSlowest = nSlowest
+        self.lock = threading.Lock()
+        # Per-thread values: variants of the word being transliterated
+        # (curVariants) and time spent in analyzerStages (analyzerSeconds)
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.reset_counters()
+
+    def reset_counters(self):
+        self.stageTimes = {}        # {stage: [seconds, calls]}
+        self.variantHistogram = {}  # {bucket: number of words}
+        self.maxVariants = 0
+        self.maxVariantsWord = ''
+        self.nWords = 0
+        self.nAnalyzerCalls = 0
+        self.nAnalyzedWords = 0
+        self.slowest = []           # heap of (seconds, word, variants)
+
+    def add_time(self, stage, seconds, calls=1):
+        with self.lock:
+            self.add_stage_time(stage, seconds, calls)
+        if stage in self.analyzerStages:
+            self.local.analyzerSeconds = getattr(self.local, 'analyzerSeconds', 0.0) + seconds
+
+    def add_stage_time(self, stage, seconds, calls):
+        if stage not in self.stageTimes:
+            self.stageTimes[stage] = [0.0, 0]
+        self.stageTimes[stage][0] += seconds
+        self.stageTimes[stage][1] += calls
+
+    def timer(self):
+        return time.perf_counter(), getattr(self.local, 'analyzerSeconds', 0.0)
+
+    def add_time_since(self, stage, start):
+        """
+        Add the time since start, returned by timer(), to the stage,
+        except the time spent in the analyzer in between.
+        Return the time including the analyzer.
+        """
+        seconds = time.perf_counter() - start[0]
+        self.add_time(stage, seconds - (getattr(self.local, 'analyzerSeconds', 0.0) - start[1]))
+        return seconds
+
+    def add_variants(self, nVariants):
+        self.local.curVariants = getattr(self.local, 'curVariants', 0) + nVariants
+
+    def take_variants(self):
+        """
+        Return the number of variants counted with add_variants
+        since the previous call.
+        """
+        nVariants = getattr(self.local, 'curVariants', 0)
+        self.local.curVariants = 0
+        return nVariants
+
+    @staticmethod
+    def bucket(nVariants):
+        """
+        Return the histogram bucket for a number of variants:
+        '1', '2-3', '4-7', '8-15' etc.
+        """
+        if nVariants <= 1:
+            return str(nVariants)
+        low = 1 << (nVariants.bit_length() - 1)
+        return str(low) + '-' + str(2 * low - 1)
+
+    def add_word(self, word, seconds, nVariants):
+        with self.lock:
+            self.add_word_counters(word, seconds, nVariants)
+
+    def add_word_counters(self, word, seconds, nVariants):
+        self.nWords += 1
+        bucket = self.bucket(nVariants)
+        self.variantHistogram[bucket] = self.variantHistogram.get(bucket, 0) + 1
+        if nVariants > self.maxVariants:
+            self.maxVariants = nVariants
+            self.maxVariantsWord = word
+        item = (seconds, word, nVariants)
+        if len(self.slowest) < self.nSlowest:
+            heapq.heappush(self.slowest, item)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def add_analyzer_call(self, nWords, seconds):
+        with self.lock:
+            self.nAnalyzerCalls += 1
+            self.nAnalyzedWords += nWords
+        self.add_time('analyzer', seconds)
+
+    def as_dict(self):
+        with self.lock:
+            return self.counters_dict()
+
+    def pop_dict(self):
+        """
+        Return as_dict() and reset the counters.
+        """
+        with self.lock:
+            statsDict = self.counters_dict()
+            self.reset_counters()
+        return statsDict
+
+    def counters_dict(self):
+        return {
+            'stages': {stage: {'seconds': round(seconds, 6), 'calls': calls}
+                       for stage, (seconds, calls) in self.stageTimes.items()},
+            'words': self.nWords,
+            'variantHistogram': dict(sorted(self.variantHistogram.items(),
+                                            key=lambda x: int(x[0].split('-')[0]))),
+            'maxVariants': self.maxVariants,
+            'maxVariantsWord': self.maxVariantsWord,
+            'analyzerCalls': self.nAnalyzerCalls,
+            'analyzedWords': self.nAnalyzedWords,
+            'slowestWords': [{'word': word, 'seconds': round(seconds, 6), 'variants': nVariants}
+                             for seconds, word, nVariants in sorted(self.slowest, reverse=True)]
+        }
+
+    def merge(self, statsDict):
+        """
+        Add the counters from a dictionary returned by as_dict()
+        (e.g. collected in another process).
+        """
+        with self.lock:
+            self.merge_counters(statsDict)
+
+    def merge_counters(self, statsDict):
+        for stage, value in statsDict['stages'].items():
+            self.add_stage_time(stage, value['seconds'], value['calls'])
+        for bucket, n in statsDict['variantHistogram'].items():
+            self.variantHistogram[bucket] = self.variantHistogram.get(bucket, 0) + n
+        if statsDict['maxVariants'] > self.maxVariants:
+            self.maxVariants = statsDict['maxVariants']
+            self.maxVariantsWord = statsDict['maxVariantsWord']
+        self.nWords += statsDict['words']
+        self.nAnalyzerCalls += statsDict['analyzerCalls']
+        self.nAnalyzedWords += statsDict['analyzedWords']
+        for item in statsDict['slowestWords']:
+            heapItem = (item['seconds'], item['word'], item['variants'])
+            if len(self.slowest) < self.nSlowest:
+                heapq.heappush(self.slowest, heapItem)
+            elif heapItem[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, heapItem)
+
+
+def sum_cache_stats(cacheStatsList, sharedCaches=('verdictStore',)):
+    """
+    Add up the cache statistics (see UdmurtTransliterator.cache_stats)
+    of several transliterators. Caches listed in sharedCaches are
+    one file used by all of them, so their sizes are not added up.
+    """
+    total = {}
+    for cacheStats in cacheStatsList:
+        for name, stats in cacheStats.items():
+            if name not in total:
+                total[name] = {'size': 0, 'maxSize': 0, 'hits': 0, 'misses': 0}
+            if name in sharedCaches:
+                total[name]['size'] = max(total[name]['size'], stats['size'])
+                total[name]['maxSize'] = stats['maxSize']
+            else:
+                total[name]['size'] += stats['size']
+                total[name]['maxSize'] += stats['maxSize']
+            total[name]['hits'] += stats['hits']
+            total[name]['misses'] += stats['misses']
+    for stats in total.values():
+        nRequests = stats['hits'] + stats['misses']
+        stats['hitRate'] = stats['hits'] / nRequests if nRequests > 0 else 0.0
+    return total
+
+
+def report_stats(stats, fnameOut):
+    """
+    Print a summary of the statistics returned by
+    UdmurtTransliterator.get_stats() and write all of them
+    to fnameOut as JSON.
+    """
+    print('Transliteration statistics (' + str(stats['words']) + ' words):')
+    for stage, value in sorted(stats['stages'].items(), key=lambda x: -x[1]['seconds']):
+        print('  ' + stage + ': ' + str(round(value['seconds'], 3)) + ' s, '
+              + str(value['calls']) + ' calls')
+    print('  Variants per word: ' + ', '.join(bucket + ': ' + str(n)
+                                              for bucket, n in stats['variantHistogram'].items()))
+    print('  Maximum: ' + str(stats['maxVariants']) + ' (' + stats['maxVariantsWord'] + ')')
+    print('  Analyzer calls: ' + str(stats['analyzerCalls']) + ', '
+          + str(stats['analyzedWords']) + ' words')
+    for name, cacheStats in stats['caches'].items():
+        print('  ' + name + ' cache hit rate: ' + str(round(cacheStats['hitRate'], 3)))
+    if len(stats['slowestWords']) > 0:
+        print('  Slowest words: ' + ', '.join(item['word'] + ' (' + str(round(item['seconds'], 3)) + ' s)'
+                                              for item in stats['slowestWords'][:5]))
+    with open(fnameOut, 'w', encoding='utf-8') as fOut:
+        json.dump(stats, fOut, ensure_ascii=False, indent=1)
+    print('Full statistics written to ' + fnameOut + '.')
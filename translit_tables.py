@@ -0,0 +1,224 @@
+import re
+
+
+# Characters that are not the upper case form of any letter,
+# but whose lower case form is a letter (the Kelvin sign)
+extraLowerForms = {'K': 'k'}
+
+
+def case_variants(letter):
+    """
+    Return all characters whose lower case form is letter.
+    """
+    variants = {letter}
+    for variant in (letter.upper(), letter.title()):
+        if len(variant) == 1 and variant.lower() == letter:
+            variants.add(variant)
+    variants.update(c for c, lower in extraLowerForms.items() if lower == letter)
+    return variants
+
+
+def letter_table(letterMap, keepCase=True):
+    """
+    Compile a dictionary {lower case letter: replacement} into
+    a str.translate table that maps every character whose lower case
+    form is in letterMap. If keepCase is True, characters that are
+    not lower case get upper case replacements, otherwise all characters
+    get the replacements as they are listed.
+    """
+    table = {}
+    for letter, replacement in letterMap.items():
+        for variant in case_variants(letter):
+            if keepCase and not variant.islower():
+                table[ord(variant)] = replacement.upper()
+            else:
+                table[ord(variant)] = replacement
+    return table
+
+
+class Rewriter:
+    """
+    Replaces several substrings in one pass over the string.
+    At each position, the longest matching substring is replaced.
+    """
+    def __init__(self, replacements):
+        self.replacements = dict(replacements)
+        self.rxWhat = re.compile('|'.join(re.escape(s)
+                                          for s in sorted(self.replacements, key=lambda x: -len(x))))
+
+    def __call__(self, text):
+        return self.rxWhat.sub(lambda m: self.replacements[m.group(0)], text)
+
+
+class RuleCascade:
+    """
+    Applies an ordered list of rewriting passes to a string.
+    Each pass is a tuple (regex, replacement, triggers). If regex
+    is None, replacement is a function applied to the whole string,
+    otherwise it is a function applied to each match. A pass is
+    skipped if the string contains none of the characters in triggers,
+    or if it repeats the previous pass and that pass changed nothing.
+    """
+    def __init__(self, passes):
+        self.passes = [(rx, replacement, frozenset(triggers))
+                       for rx, replacement, triggers in passes]
+
+    def __call__(self, text):
+        chars = set(text)
+        prevPass = None
+        prevChanged = True
+        for curPass in self.passes:
+            rx, replacement, triggers = curPass
+            if (triggers.isdisjoint(chars)
+                    or (curPass == prevPass and not prevChanged)):
+                prevPass, prevChanged = curPass, False
+                continue
+            if rx is None:
+                textNew = replacement(text)
+            else:
+                textNew = rx.sub(replacement, text)
+            prevPass, prevChanged = curPass, textNew != text
+            if prevChanged:
+                text = textNew
+                chars = set(text)
+        return text
+
+
+class RuleIndex:
+    """
+    Ordered list of whole-word rewriting rules (pattern, replacement),
+    each applied as re.compile('^' + pattern + '$').sub(replacement, word)
+    in turn. Instead of trying all rules, the rules that can match
+    a word are found with one combined regex, chosen by the first letter
+    of the word. If a pattern cannot be put into a combined regex,
+    all rules are simply tried one by one.
+    """
+    rxBackReference = re.compile('\\\\[1-9]|\\(\\?P=')
+    metaChars = '\\.^$*+?{}[]()|'
+    quantifiers = '*?{'
+
+    def __init__(self, rules):
+        # A repeated pattern keeps its first position and its last replacement
+        rulesDict = {}
+        for pattern, replacement in rules:
+            rulesDict[pattern] = replacement
+        self.rules = [(re.compile('^' + pattern + '$'), replacement)
+                      for pattern, replacement in rulesDict.items()]
+        self.combined = {}
+        self.combinedDefault = None
+        self.sequential = not all(self.is_combinable(pattern) for pattern in rulesDict)
+        if not self.sequential:
+            try:
+                self.compile_index(list(rulesDict))
+            except re.error:
+                self.sequential = True
+
+    def __len__(self):
+        return len(self.rules)
+
+    def is_combinable(self, pattern):
+        """
+        Check if the pattern means the same inside a combined regex:
+        it must not refer to its own groups or have alternatives
+        outside of brackets.
+        """
+        if self.rxBackReference.search(pattern) is not None:
+            return False
+        depth = 0
+        inClass = False
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c == '\\':
+                i += 1
+            elif inClass:
+                if c == ']':
+                    inClass = False
+            elif c == '[':
+                inClass = True
+                if pattern[i + 1:i + 2] == '^':
+                    i += 1
+                if pattern[i + 1:i + 2] == ']':
+                    i += 1
+            elif c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            elif c == '|' and depth <= 0:
+                return False
+            i += 1
+        return True
+
+    def first_letter(self, pattern):
+        """
+        Return the letter every word matched by the pattern starts with,
+        or None if it cannot be determined.
+        """
+        if len(pattern) <= 0 or pattern[0] in self.metaChars:
+            return None
+        if len(pattern) > 1 and pattern[1] in self.quantifiers:
+            return None
+        return pattern[0]
+
+    def compile_index(self, patterns):
+        """
+        Group the rules by the first letter of their patterns and compile
+        one regex for each letter. Rules that can start with any letter
+        are included in all of them.
+        """
+        ruleIndices = {}
+        anyLetter = []
+        for iRule, pattern in enumerate(patterns):
+            letter = self.first_letter(pattern)
+            if letter is None:
+                anyLetter.append(iRule)
+            else:
+                ruleIndices.setdefault(letter, []).append(iRule)
+
+        def combine(indices):
+            if len(indices) <= 0:
+                return None
+            return re.compile('|'.join('(?P<r' + str(i) + '>^' + patterns[i] + '$)'
+                                       for i in sorted(indices)))
+
+        for letter in ruleIndices:
+            self.combined[letter] = combine(ruleIndices[letter] + anyLetter)
+        self.combinedDefault = combine(anyLetter)
+
+    def first_match(self, word, iStart):
+        """
+        Return the index of the first rule starting from iStart
+        that matches the word, or None.
+        """
+        for i in range(iStart, len(self.rules)):
+            if self.rules[i][0].search(word) is not None:
+                return i
+        return None
+
+    def apply(self, word):
+        """
+        Apply all rules to the word in their order.
+        """
+        if self.sequential:
+            for rxSrc, replacement in self.rules:
+                word = rxSrc.sub(replacement, word)
+            return word
+        iStart = 0
+        while iStart < len(self.rules):
+            rxCombined = self.combined.get(word[:1], self.combinedDefault)
+            if rxCombined is None:
+                return word
+            m = rxCombined.match(word)
+            if m is None:
+                return word
+            iRule = int(m.lastgroup[1:])
+            if iRule < iStart:
+                # An earlier rule matches the rewritten word; look for
+                # the first matching rule after the last one applied
+                iRule = self.first_match(word, iStart)
+                if iRule is None:
+                    return word
+            rxSrc, replacement = self.rules[iRule]
+            word = rxSrc.sub(replacement, word)
+            iStart = iRule + 1
+        return word
@@ -1,9 +1,11 @@
 import os
 import re
+import csv
 import pandas as pd
-import numpy as np
-import html
 from udmurt_translit import UdmurtTransliterator
+from translit_pool import process_files
+from corpus_manifest import CorpusManifest, corpus_settings
+from translit_stats import report_stats
 
 
 class CsvProcessor:
@@ -15,55 +17,223 @@ class CsvProcessor:
     def __init__(self, transliterator, sep='\t',
                  srcCol=0,
                  tgtCol=1,
-                 startLine=1):
+                 startLine=1,
+                 columns=None,
+                 batchSize=1000,
+                 quoting=csv.QUOTE_NONE,
+                 escapechar=None,
+                 excelStreaming=False):
         self.transliterator = transliterator
         self.sep = sep
         self.srcCol = srcCol
         self.tgtCol = tgtCol
         self.startLine = startLine
+        # List of (source column, target column) pairs;
+        # by default, there is only one pair (srcCol, tgtCol)
+        if columns is None:
+            columns = [(srcCol, tgtCol)]
+        self.columns = columns
+        self.batchSize = batchSize      # Rows transliterated at once
+        # quoting:
+        # - csv.QUOTE_NONE: split lines at every sep, quotes are ordinary
+        #   characters (files written without a CSV library)
+        # - csv.QUOTE_MINIMAL etc.: values may be enclosed in double quotes
+        #   and contain sep and line breaks
+        self.quoting = quoting
+        # escapechar (e.g. '\\') precedes sep and line breaks inside values
+        # with csv.QUOTE_NONE: it is removed when reading and added when
+        # writing. If it is None, the files made from spreadsheets, whose
+        # values may contain sep and line breaks, are written with
+        # csv.QUOTE_MINIMAL.
+        self.escapechar = escapechar
+        # If True, XLSX files are read row by row like CSV files instead
+        # of being loaded into a DataFrame (for very large workbooks)
+        self.excelStreaming = excelStreaming
 
-    def process_file(self, fnameCsv, fnameCsvOut):
+    def csv_options(self):
         """
-        Process one CSV file.
+        Return the arguments for csv.reader and csv.writer.
         """
-        lines = []
-        # Read lines from XLSX or CSV
-        if fnameCsv.lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(fnameCsv, sheet_name=0, header=None)
-            colList = df.columns.values
-            for row in range(len(df)):
-                lines.append([])
-                for col in range(len(colList)):
-                    lines[-1].append(df[colList[col]][row])
-                    if lines[-1][-1] in (np.nan, None, 'nan'):
-                        lines[-1][-1] = ''
-                    else:
-                        lines[-1][-1] = str(lines[-1][-1])
+        options = {'delimiter': self.sep, 'quoting': self.quoting,
+                   'escapechar': self.escapechar}
+        if self.quoting == csv.QUOTE_NONE:
+            options['quotechar'] = None
+        return options
+
+    def writer_options(self, spreadsheet):
+        """
+        Return the arguments for csv.writer for a CSV file
+        or a spreadsheet (see self.escapechar).
+        """
+        options = self.csv_options()
+        if spreadsheet and self.quoting == csv.QUOTE_NONE and self.escapechar is None:
+            options['quoting'] = csv.QUOTE_MINIMAL
+            del options['quotechar']
+        return options
+
+    @staticmethod
+    def write_rows(fOut, writer, rows):
+        """
+        Write rows with a csv.writer. Rows that consist of one empty
+        value are written as empty lines, which csv.writer refuses
+        to do without quotes.
+        """
+        for row in rows:
+            if len(row) == 1 and len(row[0]) <= 0:
+                fOut.write('\n')
+            else:
+                writer.writerow(row)
+
+    def read_rows(self, fnameCsv):
+        """
+        Iterate over the rows of a CSV or XLSX file as lists of strings.
+        """
+        if fnameCsv.lower().endswith('.xlsx'):
+            # openpyxl is only needed for reading XLSX files row by row
+            import openpyxl
+            wb = openpyxl.load_workbook(fnameCsv, read_only=True)
+            try:
+                for values in wb.worksheets[0].iter_rows(values_only=True):
+                    yield ['' if value is None or value == 'nan' else str(value)
+                           for value in values]
+            finally:
+                wb.close()
         elif fnameCsv.lower().endswith(('.csv', '.tsv')):
-            with open(fnameCsv, 'r', encoding='utf-8-sig') as fIn:
-                lines = [list(line.strip('\r\n').split(self.sep)) for line in fIn.readlines()]
+            with open(fnameCsv, 'r', encoding='utf-8-sig', newline='') as fIn:
+                for line in csv.reader(fIn, **self.csv_options()):
+                    yield line
+
+    def source_texts(self, fnameCsv):
+        """
+        Iterate over the values of the source columns of a file.
+        """
+        if (fnameCsv.lower().endswith('.xls')
+                or (fnameCsv.lower().endswith('.xlsx') and not self.excelStreaming)):
+            df = pd.read_excel(fnameCsv, sheet_name=0, header=None)
+            rows = df.where(df.notna(), '').astype(str).replace('nan', '').values.tolist()
+        else:
+            rows = self.read_rows(fnameCsv)
+        for iLine, line in enumerate(rows):
+            if iLine < self.startLine:
+                continue
+            for srcCol, tgtCol in self.columns:
+                if len(line) > srcCol:
+                    yield line[srcCol]
+
+    def transliterate_rows(self, lines):
+        """
+        Fill the target columns of a batch of rows.
+        """
+        cells = [(i, srcCol, tgtCol) for i in range(len(lines))
+                 for srcCol, tgtCol in self.columns
+                 if len(lines[i]) > srcCol]
+        # All source cells of the batch are transliterated at once
+        tgtTexts = self.transliterator.transliterate_many([lines[i][srcCol] for i, srcCol, tgtCol in cells])
+        for (i, srcCol, tgtCol), tgtText in zip(cells, tgtTexts):
+            if len(lines[i]) <= tgtCol:
+                lines[i] += [''] * (tgtCol - len(lines[i]) + 1)
+            lines[i][tgtCol] = tgtText
+
+    def process_dataframe(self, fnameExcel, fOut, writer):
+        """
+        Process one XLSX or XLS file as a DataFrame. Each distinct
+        value of a source column is transliterated once, and the
+        results are mapped back to the column.
+        """
+        df = pd.read_excel(fnameExcel, sheet_name=0, header=None)
+        df = df.where(df.notna(), '').astype(str).replace('nan', '')
+        df.columns = range(len(df.columns))
+        for srcCol, tgtCol in self.columns:
+            if srcCol >= len(df.columns):
+                continue
+            for col in range(len(df.columns), tgtCol + 1):
+                df[col] = ''
+            srcValues = df.iloc[self.startLine:, srcCol]
+            uniqueValues = list(srcValues.unique())
+            tgtValues = dict(zip(uniqueValues, self.transliterator.transliterate_many(uniqueValues)))
+            df.iloc[self.startLine:, tgtCol] = srcValues.map(tgtValues)
+        self.write_rows(fOut, writer, df.itertuples(index=False, name=None))
+
+    def process_file(self, fnameCsv, fnameCsvOut):
+        """
+        Process one CSV file. The rows are read, transliterated
+        in batches of self.batchSize and written one batch at a time.
+        Spreadsheets are processed as DataFrames, unless
+        self.excelStreaming is set (only for XLSX). The output
+        is only moved to fnameCsvOut if the whole file is processed.
+        """
+        spreadsheet = fnameCsv.lower().endswith(('.xlsx', '.xls'))
+        fnameTmp = fnameCsvOut + '.tmp'
+        try:
+            with open(fnameTmp, 'w', encoding='utf-8-sig', newline='') as fOut:
+                writer = csv.writer(fOut, lineterminator='\n', **self.writer_options(spreadsheet))
+                if (fnameCsv.lower().endswith('.xls')
+                        or (fnameCsv.lower().endswith('.xlsx') and not self.excelStreaming)):
+                    self.process_dataframe(fnameCsv, fOut, writer)
+                else:
+                    self.process_rows(fnameCsv, fOut, writer)
+        except Exception:
+            if os.path.exists(fnameTmp):
+                os.remove(fnameTmp)
+            raise
+        os.replace(fnameTmp, fnameCsvOut)
 
-        # Process data and write CSV
-        for i in range(self.startLine, len(lines)):
-            if len(lines[i]) <= self.srcCol:
+    def process_rows(self, fnameCsv, fOut, writer):
+        """
+        Transliterate a CSV or XLSX file row by row.
+        """
+        batch = []
+        for iLine, line in enumerate(self.read_rows(fnameCsv)):
+            if iLine < self.startLine:
+                self.write_rows(fOut, writer, [line])
                 continue
-            srcText = lines[i][self.srcCol]
-            tgtText = self.transliterator.transliterate(srcText)
-            if len(lines[i]) <= self.tgtCol:
-                lines[i] += [''] * (self.tgtCol - len(lines) + 1)
-            lines[i][self.tgtCol] = tgtText
-        lines = [self.sep.join(line) for line in lines]
-        with open(fnameCsvOut, 'w', encoding='utf-8-sig') as fOut:
-            fOut.write('\n'.join(lines))
-
-    def process_corpus(self):
+            batch.append(line)
+            if len(batch) >= self.batchSize:
+                self.transliterate_rows(batch)
+                self.write_rows(fOut, writer, batch)
+                batch = []
+        if len(batch) > 0:
+            self.transliterate_rows(batch)
+            self.write_rows(fOut, writer, batch)
+
+    def settings(self):
+        """
+        Return the settings that affect the output as a dictionary.
+        """
+        return {
+            'sep': self.sep,
+            'columns': [list(pair) for pair in self.columns],
+            'startLine': self.startLine,
+            'quoting': self.quoting,
+            'escapechar': self.escapechar,
+            'excelStreaming': self.excelStreaming
+        }
+
+    def __getstate__(self):
+        # The transliterator is not sent to worker processes
+        state = self.__dict__.copy()
+        state['transliterator'] = None
+        return state
+
+    def process_corpus(self, nWorkers=1, incremental=False, threads=False):
+        """
+        Transliterate all files in the csv folder. If nWorkers > 1,
+        process them in parallel, each worker with its own transliterator
+        or, if threads is True, in nWorkers threads sharing self.transliterator
+        (the output is the same as in a serial run if the transliterator
+        does not pick options randomly). If incremental is True,
+        files processed in an earlier run with the same input
+        and settings are skipped (see corpus_manifest.py).
+        If the transliterator collects statistics, they are
+        printed and written to csv_transliterated/translit_stats.json.
+        """
         if not os.path.exists('csv'):
             print('All CSV files should be located in the csv folder.')
             return
         if not os.path.exists('csv_transliterated'):
             os.makedirs('csv_transliterated')
 
-        nDocs = 0
+        tasks = []
         for root, dirs, files in os.walk('csv'):
             for fname in files:
                 if not fname.lower().endswith(('.csv', '.tsv', '.xlsx', '.xls')):
@@ -73,14 +243,45 @@ class CsvProcessor:
                 outDirName = CsvProcessor.rxDir.sub('', fnameCsvOut)
                 if len(outDirName) > 0 and not os.path.exists(outDirName):
                     os.makedirs(outDirName)
+                tasks.append((fnameCsv, fnameCsvOut))
+        allFiles = [fnameIn for fnameIn, fnameOut in tasks]
+
+        manifest = None
+        nSkipped = 0
+        if incremental:
+            settings = corpus_settings(self.transliterator, self.settings(), 'transliterate_csv.py')
+            manifest = CorpusManifest('csv_transliterated', settings)
+            nTasks = len(tasks)
+            tasks = [task for task in tasks if not manifest.is_up_to_date(*task)]
+            nSkipped = nTasks - len(tasks)
+        outFiles = dict(tasks)
+        nDocs = 0
+        try:
+            for fnameCsv, error in process_files(self, tasks, nWorkers=nWorkers, threads=threads):
+                if error is not None:
+                    print('Error when processing ' + fnameCsv + ': ' + error)
+                    continue
                 nDocs += 1
-                self.process_file(fnameCsv, fnameCsvOut)
+                if manifest is not None:
+                    manifest.mark_done(fnameCsv, outFiles[fnameCsv])
+                    if nDocs % 100 == 0:
+                        manifest.save()
+        finally:
+            if manifest is not None:
+                manifest.save(fnamesIn=allFiles)
         print(str(nDocs) + ' documents processed.')
+        if nSkipped > 0:
+            print(str(nSkipped) + ' documents were up to date.')
+        if nDocs < len(tasks):
+            print(str(len(tasks) - nDocs) + ' documents could not be processed.')
+        stats = self.transliterator.get_stats()
+        if stats is not None:
+            report_stats(stats, os.path.join('csv_transliterated', 'translit_stats.json'))
 
 
 if __name__ == '__main__':
     transliterator = UdmurtTransliterator(src='tatyshly_cyr', target='standard',
                                           eafCleanup=True)
     cp = CsvProcessor(transliterator, sep='\t', srcCol=1, tgtCol=0, startLine=1)
-    cp.process_corpus()
+    cp.process_corpus(incremental=True)
 
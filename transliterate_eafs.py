@@ -1,8 +1,12 @@
 import os
 import re
-import html
+import json
+import tempfile
 from lxml import etree
 from udmurt_translit import UdmurtTransliterator
+from translit_pool import process_files
+from corpus_manifest import CorpusManifest, corpus_settings
+from translit_stats import report_stats
 
 
 EAF_TIME_MULTIPLIER = 1000  # time stamps are in milliseconds
@@ -20,7 +24,9 @@ class EafProcessor:
                  translitType='transcription_st',
                  translitTierPfx='tx_st',
                  csTier=None,
-                 csTurnOffRegex=''):
+                 csTurnOffRegex='',
+                 streaming=False,
+                 streamChunkSize=1000):
         self.transliterator = transliterator
         self.eafTree = None
         self.replaceSegments = replaceSegments  # Whether segment text should be
@@ -40,13 +46,64 @@ class EafProcessor:
             if not self.csTier.endswith('$'):
                 self.csTier += '$'
             self.rxCSTier = re.compile(self.csTier)
-        self.csTranscriptionSegments = []
+        self.csTranscriptionSegments = set()
+        self.docIndex = None
         if not tiers.startswith('^'):
             tiers = '^' + tiers
         if not tiers.endswith('$'):
             tiers += '$'
         self.rxTiers = re.compile(tiers)    # regex for names or types of tiers to be transliterated
         self.lastID = 0
+        # In the streaming mode, files are read and written element
+        # by element instead of being loaded into memory completely;
+        # streamChunkSize segments are transliterated at once
+        self.streaming = streaming
+        self.streamChunkSize = streamChunkSize
+
+    def is_translit_tier(self, tierAttrib):
+        """
+        Check if a tier with these attributes has to be transliterated.
+        """
+        return 'TIER_ID' in tierAttrib and (self.rxTiers.search(tierAttrib['TIER_ID']) is not None
+                                            or self.rxTiers.search(tierAttrib['LINGUISTIC_TYPE_REF']) is not None)
+
+    def is_cs_tier(self, tierAttrib):
+        """
+        Check if code switching is annotated in a tier with these attributes.
+        """
+        if self.csTier is None or len(self.csTier) <= 0 or 'TIER_ID' not in tierAttrib:
+            return False
+        return (self.rxCSTier.search(tierAttrib['TIER_ID']) is not None
+                or self.rxCSTier.search(tierAttrib['LINGUISTIC_TYPE_REF']) is not None)
+
+    def index_document(self):
+        """
+        Go through the top-level elements of self.eafTree once and
+        collect everything the transliteration needs: the tiers to
+        be transliterated, code switching data, the header property
+        with the last annotation ID and the existing tier types.
+        """
+        self.docIndex = {
+            'translitTiers': [],
+            'lastTier': None,
+            'lastIDNode': None,
+            'tierTypes': set()
+        }
+        self.csTranscriptionSegments = set()
+        for node in self.eafTree.getroot().iterchildren():
+            if node.tag == 'TIER':
+                self.docIndex['lastTier'] = node
+                if self.is_translit_tier(node.attrib):
+                    self.docIndex['translitTiers'].append(node)
+                if self.is_cs_tier(node.attrib):
+                    for annoNode in node.iterchildren('ANNOTATION'):
+                        self.collect_cs_segment(annoNode, self.csTranscriptionSegments)
+            elif node.tag == 'LINGUISTIC_TYPE':
+                self.docIndex['tierTypes'].add(node.get('LINGUISTIC_TYPE_ID'))
+            elif node.tag == 'HEADER':
+                for propNode in node.iterchildren('PROPERTY'):
+                    if propNode.get('NAME') == 'lastUsedAnnotationId':
+                        self.docIndex['lastIDNode'] = propNode
 
     def check_tier_types(self):
         """
@@ -58,41 +115,58 @@ class EafProcessor:
         tierAttrs = [
             ('Symbolic_Association', self.translitType)
         ]
+        lastTier = self.docIndex['lastTier']
         for constraint, tierType in tierAttrs:
-            tierTypeTxt = '<LINGUISTIC_TYPE CONSTRAINTS="' + constraint + '"' \
-                          ' GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="' + tierType + '"' \
-                          ' TIME_ALIGNABLE="false"/>\n'
-            tierEl = self.eafTree.xpath(
-                '/ANNOTATION_DOCUMENT/LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID=\'' + tierType + '\']')
-            lastTier = self.eafTree.xpath('/ANNOTATION_DOCUMENT/TIER')[-1]
-            tierParent = lastTier.getparent()
-            if len(tierEl) <= 0:
-                tierParent.insert(tierParent.index(lastTier) + 1, etree.XML(tierTypeTxt))
-
-    def collectCSData(self):
-        """
-        If there are code switching tiers, collect IDs of
-        transcription segments corresponding to the code
-        switching instances.
-        """
-        if self.csTier is None or len(self.csTier) <= 0:
-            return
-        self.csTranscriptionSegments = []
-        for tierNode in self.eafTree.xpath('/ANNOTATION_DOCUMENT/TIER'):
-            if 'TIER_ID' not in tierNode.attrib:
+            if tierType in self.docIndex['tierTypes'] or lastTier is None:
                 continue
-            tierID = tierNode.attrib['TIER_ID']
-            if (self.rxCSTier.search(tierID) is not None
-                    or self.rxCSTier.search(tierNode.attrib['LINGUISTIC_TYPE_REF']) is not None):
-                for segNode in tierNode.xpath('ANNOTATION/REF_ANNOTATION'):
-                    if 'ANNOTATION_REF' not in segNode.attrib:
-                        continue
-                    try:
-                        segText = segNode.xpath('ANNOTATION_VALUE')[0].text.strip().lower()
-                    except AttributeError:
-                        continue
-                    if self.csTurnOffRegex.search(segText) is not None:
-                        self.csTranscriptionSegments.append(segNode.attrib['ANNOTATION_REF'])
+            tierTypeEl = self.tier_type_element(constraint, tierType)
+            tierTypeEl.tail = lastTier.tail
+            lastTier.addnext(tierTypeEl)
+            self.docIndex['tierTypes'].add(tierType)
+
+    @staticmethod
+    def tier_type_element(constraint, tierType):
+        """
+        Create an XML element describing a tier type.
+        """
+        return etree.Element('LINGUISTIC_TYPE', {
+            'CONSTRAINTS': constraint,
+            'GRAPHIC_REFERENCES': 'false',
+            'LINGUISTIC_TYPE_ID': tierType,
+            'TIME_ALIGNABLE': 'false'
+        })
+
+    def collect_cs_segment(self, annoNode, csSegments):
+        """
+        Add the ID of the transcription segment to csSegments
+        if the code switching annotation turns transliteration off.
+        """
+        segNode = annoNode.find('REF_ANNOTATION')
+        if segNode is None or 'ANNOTATION_REF' not in segNode.attrib:
+            return
+        valueNode = segNode.find('ANNOTATION_VALUE')
+        if valueNode is None or valueNode.text is None:
+            return
+        if self.csTurnOffRegex.search(valueNode.text.strip().lower()) is not None:
+            csSegments.add(segNode.attrib['ANNOTATION_REF'])
+
+    def segment_text(self, annoNode, csSegments):
+        """
+        Return (segment ID, lower-cased text, ANNOTATION_VALUE element)
+        for an annotation of a transcription tier, or None if it
+        should not be transliterated.
+        """
+        segNode = annoNode.find('ALIGNABLE_ANNOTATION')
+        if segNode is None or 'ANNOTATION_ID' not in segNode.attrib:
+            return None
+        segID = segNode.attrib['ANNOTATION_ID']
+        if segID in csSegments:
+            # Do not transliterate code switches
+            return None
+        valueNode = segNode.find('ANNOTATION_VALUE')
+        if valueNode is None or valueNode.text is None:
+            return None
+        return segID, valueNode.text.strip().lower(), valueNode
 
     def write_output(self, fnameEafOut):
         """
@@ -105,106 +179,464 @@ class EafProcessor:
                            xml_declaration=True,
                            encoding="utf-8")
 
-    def create_dependent_annotation(self, curID, parentID, text, prevID=''):
+    def create_dependent_annotation(self, curID, parentID, text, prevID='', tierNode=None):
         """
         Create an XML element representing one annotation in transliteration tiers.
+        If tierNode is given, append it to that tier.
         """
-        if prevID == '':
-            annoTxt = '<ANNOTATION>\n\t\t\t<REF_ANNOTATION ANNOTATION_ID="' + curID \
-                      + '" ANNOTATION_REF="' + parentID + '">\n'
+        attrib = {'ANNOTATION_ID': curID, 'ANNOTATION_REF': parentID}
+        if prevID != '':
+            attrib['PREVIOUS_ANNOTATION'] = prevID
+        if tierNode is None:
+            annoEl = etree.Element('ANNOTATION')
         else:
-            annoTxt = '<ANNOTATION>\n\t\t\t<REF_ANNOTATION ANNOTATION_ID="' + curID \
-                      + '" ANNOTATION_REF="' + parentID + '" PREVIOUS_ANNOTATION="' + prevID + '">\n'
-        annoTxt += '\t\t\t\t<ANNOTATION_VALUE>' + html.escape(text) \
-                   + '</ANNOTATION_VALUE>\n\t\t\t</REF_ANNOTATION>\n\t\t</ANNOTATION>'
-        return etree.XML(annoTxt)
+            annoEl = etree.SubElement(tierNode, 'ANNOTATION')
+        refEl = etree.SubElement(annoEl, 'REF_ANNOTATION', attrib)
+        etree.SubElement(refEl, 'ANNOTATION_VALUE').text = text
+        return annoEl
+
+    def translit_tier_attrib(self, tierID, participant):
+        return {
+            'LINGUISTIC_TYPE_REF': self.translitType,
+            'PARENT_REF': tierID,
+            'PARTICIPANT': participant,
+            'TIER_ID': self.translitTierPfx + '@' + participant
+        }
 
     def process_tier(self, tierNode, participant):
         """
         Transliterate one transcription tier.
         """
-        tierID = tierNode.attrib['TIER_ID']
-        translitTierTxt = '<TIER LINGUISTIC_TYPE_REF="' + self.translitType + \
-                          '" PARENT_REF="' + tierID + '" PARTICIPANT="' + participant + \
-                          '" TIER_ID="' + self.translitTierPfx + '@' + participant + '"/>\n'
-        translitTier = etree.XML(translitTierTxt)
-        tierParent = tierNode.getparent()
+        segments = []
+        for annoNode in tierNode.iterchildren('ANNOTATION'):
+            segment = self.segment_text(annoNode, self.csTranscriptionSegments)
+            if segment is not None:
+                segments.append(segment)
+
+        # The whole tier is transliterated at once
+        transTexts = self.transliterator.transliterate_many([segText for segID, segText, valueNode in segments])
+        if self.replaceSegments:
+            for (segID, segText, valueNode), transText in zip(segments, transTexts):
+                valueNode.text = transText
+            return
+        translitTier = etree.Element('TIER', self.translit_tier_attrib(tierNode.attrib['TIER_ID'], participant))
+        for (segID, segText, valueNode), transText in zip(segments, transTexts):
+            curWordID = 'a' + str(self.lastID)
+            self.lastID += 1
+            self.create_dependent_annotation(curWordID, segID, transText, tierNode=translitTier)
+        # pretty_print does not indent elements inserted into a parsed tree
+        etree.indent(translitTier, space='    ', level=1)
+        translitTier.tail = tierNode.tail
+        tierNode.addnext(translitTier)
+
+    def tier_participant(self, tierAttrib, participantID):
+        """
+        Return the participant of a tier and the number
+        for the next tier without one.
+        """
+        participant = tierAttrib.get('PARTICIPANT', '')
+        if len(participant) <= 0:
+            participant = 'SP' + str(participantID)
+            participantID += 1
+        return participant, participantID
+
+    def transliterate(self):
+        """
+        Transliterate self.eafTree.
+        """
+        self.index_document()
+        self.check_tier_types()
+        participantID = 1
+        for tierNode in self.docIndex['translitTiers']:
+            participant, participantID = self.tier_participant(tierNode.attrib, participantID)
+            self.process_tier(tierNode, participant)
+        self.docIndex['lastIDNode'].text = str(self.lastID - 1)
+
+    def settings(self):
+        """
+        Return the settings that affect the output as a dictionary.
+        """
+        return {
+            'tiers': self.rxTiers.pattern,
+            'replaceSegments': self.replaceSegments,
+            'translitType': self.translitType,
+            'translitTierPfx': self.translitTierPfx,
+            'csTier': self.csTier,
+            'csTurnOffRegex': self.csTurnOffRegex.pattern if len(self.csTier) > 0 else '',
+            'streaming': self.streaming
+        }
+
+    def __getstate__(self):
+        # The transliterator and the current tree are not
+        # sent to worker processes
+        state = self.__dict__.copy()
+        state['transliterator'] = None
+        state['eafTree'] = None
+        return state
+
+    def process_file(self, fnameEaf, fnameEafOut):
+        """
+        Transliterate one ELAN file and write the result.
+        """
+        if self.streaming:
+            self.process_file_streaming(fnameEaf, fnameEafOut)
+            return
+        self.eafTree = etree.parse(fnameEaf)
+        self.lastID = int(self.eafTree.find('HEADER/PROPERTY[@NAME=\'lastUsedAnnotationId\']').text) + 1
+        self.transliterate()
+        self.write_output(fnameEafOut)
+        self.eafTree = None
+        self.docIndex = None
+
+    @staticmethod
+    def iter_elements(fnameEaf, keepComments=False):
+        """
+        Read an ELAN file incrementally. Yield tuples (event, element, depth),
+        where depth is 0 for the root element. Processed elements
+        should be deleted with release(). If keepComments is True,
+        comments and processing instructions are kept in the elements
+        and also yielded with the events 'comment' and 'pi'.
+        """
+        depth = 0
+        events = ('start', 'end')
+        if keepComments:
+            events += ('comment', 'pi')
+        for event, el in etree.iterparse(fnameEaf, events=events,
+                                         remove_comments=not keepComments,
+                                         remove_pis=not keepComments):
+            if event in ('comment', 'pi'):
+                yield event, el, depth
+                continue
+            if event == 'start':
+                yield event, el, depth
+                depth += 1
+                continue
+            depth -= 1
+            yield event, el, depth
 
-        for segNode in tierNode.xpath('ANNOTATION/ALIGNABLE_ANNOTATION'):
-            if 'ANNOTATION_ID' not in segNode.attrib:
+    @staticmethod
+    def release(el):
+        """
+        Free the memory taken by a processed element
+        and its preceding siblings.
+        """
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+
+    def source_texts(self, fnameEaf):
+        """
+        Iterate over the texts of the segments of the tiers
+        to be transliterated in an ELAN file, as they are sent
+        to the transliterator (code switching is not checked).
+        """
+        isTranslitTier = False
+        for event, el, depth in self.iter_elements(fnameEaf):
+            if event == 'start':
+                if depth == 1 and el.tag == 'TIER':
+                    isTranslitTier = self.is_translit_tier(el.attrib)
                 continue
-            segID = segNode.attrib['ANNOTATION_ID']
-            if segID in self.csTranscriptionSegments:
-                # Do not transliterate code switches
+            if depth == 1:
+                isTranslitTier = False
+                self.release(el)
+            elif depth == 2 and el.getparent().tag in ('TIER', 'TIME_ORDER'):
+                if isTranslitTier:
+                    segment = self.segment_text(el, ())
+                    if segment is not None:
+                        yield segment[1]
+                self.release(el)
+
+    def scan_file(self, fnameEaf):
+        """
+        First pass of the streaming mode: collect the IDs of
+        code-switched transcription segments and the information
+        needed to add the tier type. Return a dictionary.
+        """
+        info = {
+            'csSegments': set(),
+            'hasTierType': False,
+            'lastTierPos': -1,
+            'lastUsedAnnotationId': 0,
+            'nNewAnnotations': 0
+        }
+        iChild = 0
+        isCSTier = False
+        for event, el, depth in self.iter_elements(fnameEaf):
+            if event == 'start':
+                if depth == 1 and el.tag == 'TIER':
+                    isCSTier = self.is_cs_tier(el.attrib)
                 continue
-            try:
-                segText = segNode.xpath('ANNOTATION_VALUE')[0].text.strip().lower()
-            except AttributeError:
+            if depth == 1:
+                if el.tag == 'TIER':
+                    info['lastTierPos'] = iChild
+                elif el.tag == 'LINGUISTIC_TYPE' and el.get('LINGUISTIC_TYPE_ID') == self.translitType:
+                    info['hasTierType'] = True
+                elif el.tag == 'HEADER':
+                    for propNode in el.iterchildren('PROPERTY'):
+                        if propNode.get('NAME') == 'lastUsedAnnotationId':
+                            info['lastUsedAnnotationId'] = int(propNode.text)
+                iChild += 1
+                isCSTier = False
+                self.release(el)
+            elif depth == 2 and el.getparent().tag in ('TIER', 'TIME_ORDER'):
+                if isCSTier:
+                    self.collect_cs_segment(el, info['csSegments'])
+                self.release(el)
+        return info
+
+    def count_new_annotations(self, fnameEaf, csSegments):
+        """
+        Second pass of the streaming mode: count the segments that
+        will get transliterations.
+        """
+        nSegments = 0
+        isTranslitTier = False
+        for event, el, depth in self.iter_elements(fnameEaf):
+            if event == 'start':
+                if depth == 1 and el.tag == 'TIER':
+                    isTranslitTier = self.is_translit_tier(el.attrib)
                 continue
-            transText = self.transliterator.transliterate(segText)
+            if depth == 1:
+                isTranslitTier = False
+                self.release(el)
+            elif depth == 2 and el.getparent().tag in ('TIER', 'TIME_ORDER'):
+                if isTranslitTier and self.segment_text(el, csSegments) is not None:
+                    nSegments += 1
+                self.release(el)
+        return nSegments
+
+    @staticmethod
+    def detached_copy(el):
+        """
+        Copy an element without whitespace between the tags and
+        without namespace declarations inherited from the document.
+        """
+        if el.tag is etree.Comment:
+            return etree.Comment(el.text)
+        if el.tag is etree.ProcessingInstruction:
+            return etree.ProcessingInstruction(el.target, el.text)
+        copyEl = etree.Element(el.tag, el.attrib)
+        if el.text is not None and (len(el) <= 0 or len(el.text.strip()) > 0):
+            copyEl.text = el.text
+        for child in el:
+            copyEl.append(EafProcessor.detached_copy(child))
+            if child.tail is not None and len(child.tail.strip()) > 0:
+                copyEl[-1].tail = child.tail
+        return copyEl
+
+    @staticmethod
+    def write_element(xf, el, level):
+        """
+        Write an element of the input file to the output file
+        at the given depth.
+        """
+        el = EafProcessor.detached_copy(el)
+        if isinstance(el.tag, str):
+            etree.indent(el, space='    ', level=level)
+        xf.write('\n' + '    ' * level)
+        xf.write(el, with_tail=False)
+
+    def flush_segments(self, xf, segments, spool):
+        """
+        Transliterate a chunk of segments of the current tier. If segments
+        are replaced, write the annotations, otherwise store the new
+        annotations in spool to be written after the tier.
+        segments is a list of tuples (annotation element, segment ID, text);
+        the elements are None if they have already been written.
+        """
+        transTexts = self.transliterator.transliterate_many([segText for annoNode, segID, segText in segments])
+        for (annoNode, segID, segText), transText in zip(segments, transTexts):
             if self.replaceSegments:
-                segNode.xpath('ANNOTATION_VALUE')[0].text = transText
-                continue
+                annoNode.find('ALIGNABLE_ANNOTATION/ANNOTATION_VALUE').text = transText
+                self.write_element(xf, annoNode, 2)
+                annoNode.clear()
             else:
                 curWordID = 'a' + str(self.lastID)
                 self.lastID += 1
-                translitEl = self.create_dependent_annotation(curWordID, segID, transText)
-                translitTier.insert(len(translitTier), translitEl)
-        if not self.replaceSegments:
-            tierParent.insert(tierParent.index(tierNode) + 1, translitTier)
+                spool.write(json.dumps([curWordID, segID, transText], ensure_ascii=False) + '\n')
+        segments.clear()
 
-    def transliterate(self):
+    def write_translit_tier(self, xf, tierAttrib, spool):
         """
-        Transliterate self.eafTree.
+        Write a transliteration tier with the annotations stored in spool.
         """
-        self.check_tier_types()
+        xf.write('\n    ')
+        with xf.element('TIER', tierAttrib):
+            spool.seek(0)
+            for line in spool:
+                curWordID, segID, transText = json.loads(line)
+                xf.write('\n' + '    ' * 2)
+                annoEl = self.create_dependent_annotation(curWordID, segID, transText)
+                etree.indent(annoEl, space='    ', level=2)
+                xf.write(annoEl, with_tail=False)
+            xf.write('\n    ')
+        spool.seek(0)
+        spool.truncate()
+
+    def process_file_streaming(self, fnameEaf, fnameEafOut):
+        """
+        Transliterate one ELAN file without loading it into memory.
+        The file is read three times: to collect code switching data,
+        to count new annotations (their number goes to the header,
+        which precedes the tiers), and to write the output.
+        """
+        info = self.scan_file(fnameEaf)
+        csSegments = info['csSegments']
+        nNewAnnotations = 0
+        if not self.replaceSegments:
+            nNewAnnotations = self.count_new_annotations(fnameEaf, csSegments)
+        self.lastID = info['lastUsedAnnotationId'] + 1
         participantID = 1
-        self.collectCSData()
-        for tierNode in self.eafTree.xpath('/ANNOTATION_DOCUMENT/TIER'):
-            if 'TIER_ID' not in tierNode.attrib:
-                continue
-            tierID = tierNode.attrib['TIER_ID']
-            if (self.rxTiers.search(tierID) is not None
-                    or self.rxTiers.search(tierNode.attrib['LINGUISTIC_TYPE_REF']) is not None):
-                if 'PARTICIPANT' not in tierNode.attrib:
-                    participant = ''
-                else:
-                    participant = tierNode.attrib['PARTICIPANT']
-                if len(participant) <= 0:
-                    participant = 'SP' + str(participantID)
-                    participantID += 1
-                self.process_tier(tierNode, participant)
-        self.eafTree.xpath('/ANNOTATION_DOCUMENT/HEADER/'
-                           'PROPERTY[@NAME=\'lastUsedAnnotationId\']')[0].text = str(self.lastID - 1)
-
-    def process_corpus(self):
+        iChild = 0
+        tierContext = None          # Open element context for TIER or TIME_ORDER
+        translitTierAttrib = None   # Attributes of the new tier for the current tier
+        segments = []
+        with open(fnameEafOut, 'wb') as fOut, tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+            fOut.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+            events = self.iter_elements(fnameEaf, keepComments=True)
+            # Comments and processing instructions before the root element
+            # are written directly, as xmlfile cannot separate them by line breaks
+            for event, root, depth in events:
+                if event == 'start':
+                    break
+                fOut.write(etree.tostring(root, encoding='utf-8') + b'\n')
+            with etree.xmlfile(fOut, encoding='utf-8') as xf:
+                with xf.element(root.tag, root.attrib, nsmap=root.nsmap):
+                    for event, el, depth in events:
+                        if depth == 0:
+                            # End of the root element
+                            break
+                        if event in ('comment', 'pi'):
+                            # Comments inside other elements are written with them
+                            if depth == 1 or (depth == 2 and tierContext is not None):
+                                if len(segments) > 0 and self.replaceSegments:
+                                    self.flush_segments(xf, segments, spool)
+                                self.write_element(xf, el, depth)
+                            continue
+                        if depth != 1 and depth != 2:
+                            continue
+                        if event == 'start':
+                            if depth == 1 and el.tag in ('TIER', 'TIME_ORDER'):
+                                # Long elements are written child by child
+                                xf.write('\n    ')
+                                tierContext = xf.element(el.tag, el.attrib)
+                                tierContext.__enter__()
+                                translitTierAttrib = None
+                                if el.tag == 'TIER' and self.is_translit_tier(el.attrib):
+                                    participant, participantID = self.tier_participant(el.attrib, participantID)
+                                    translitTierAttrib = self.translit_tier_attrib(el.attrib['TIER_ID'], participant)
+                            continue
+                        if depth == 2:
+                            if tierContext is None:
+                                continue
+                            segment = None
+                            if translitTierAttrib is not None:
+                                segment = self.segment_text(el, csSegments)
+                            if segment is None or not self.replaceSegments:
+                                if len(segments) > 0 and self.replaceSegments:
+                                    self.flush_segments(xf, segments, spool)
+                                self.write_element(xf, el, 2)
+                                self.release(el)
+                            if segment is not None:
+                                segID, segText, valueNode = segment
+                                segments.append((el if self.replaceSegments else None, segID, segText))
+                                if len(segments) >= self.streamChunkSize:
+                                    self.flush_segments(xf, segments, spool)
+                            continue
+                        # End of a child of the root
+                        if tierContext is not None:
+                            if len(segments) > 0:
+                                self.flush_segments(xf, segments, spool)
+                            xf.write('\n    ')
+                            tierContext.__exit__(None, None, None)
+                            tierContext = None
+                            if translitTierAttrib is not None and not self.replaceSegments:
+                                self.write_translit_tier(xf, translitTierAttrib, spool)
+                        else:
+                            if el.tag == 'HEADER':
+                                for propNode in el.iterchildren('PROPERTY'):
+                                    if propNode.get('NAME') == 'lastUsedAnnotationId':
+                                        propNode.text = str(info['lastUsedAnnotationId'] + nNewAnnotations)
+                            self.write_element(xf, el, 1)
+                        if (iChild == info['lastTierPos'] and not info['hasTierType']
+                                and not self.replaceSegments):
+                            xf.write('\n    ')
+                            xf.write(self.tier_type_element('Symbolic_Association', self.translitType))
+                        iChild += 1
+                        self.release(el)
+                    xf.write('\n')
+            # Comments and processing instructions after the root element
+            for event, el, depth in events:
+                fOut.write(b'\n' + etree.tostring(el, encoding='utf-8'))
+        if self.lastID - 1 != info['lastUsedAnnotationId'] + nNewAnnotations:
+            raise RuntimeError('Annotation count mismatch in ' + fnameEaf)
+
+    def process_corpus(self, nWorkers=1, incremental=False, threads=False):
+        """
+        Transliterate all ELAN files in the eaf folder. If nWorkers > 1,
+        process them in parallel, each worker with its own transliterator
+        or, if threads is True, in nWorkers threads sharing self.transliterator
+        (the output is the same as in a serial run if the transliterator
+        does not pick options randomly). If incremental is True,
+        files processed in an earlier run with the same input
+        and settings are skipped (see corpus_manifest.py).
+        If the transliterator collects statistics, they are
+        printed and written to eaf_transliterated/translit_stats.json.
+        """
         if not os.path.exists('eaf'):
             print('All ELAN files should be located in the eaf folder.')
             return
         if not os.path.exists('eaf_transliterated'):
             os.makedirs('eaf_transliterated')
 
-        nDocs = 0
+        tasks = []
         for root, dirs, files in os.walk('eaf'):
             for fname in files:
                 if not fname.lower().endswith('.eaf'):
                     continue
                 fnameEaf = os.path.join(root, fname)
                 fnameEafOut = 'eaf_transliterated' + fnameEaf[3:]
-                self.eafTree = etree.parse(fnameEaf)
                 outDirName = EafProcessor.rxDir.sub('', fnameEafOut)
                 if len(outDirName) > 0 and not os.path.exists(outDirName):
                     os.makedirs(outDirName)
+                tasks.append((fnameEaf, fnameEafOut))
+        allFiles = [fnameIn for fnameIn, fnameOut in tasks]
+
+        manifest = None
+        nSkipped = 0
+        if incremental:
+            settings = corpus_settings(self.transliterator, self.settings(), 'transliterate_eafs.py')
+            manifest = CorpusManifest('eaf_transliterated', settings)
+            nTasks = len(tasks)
+            tasks = [task for task in tasks if not manifest.is_up_to_date(*task)]
+            nSkipped = nTasks - len(tasks)
+        outFiles = dict(tasks)
+        nDocs = 0
+        try:
+            for fnameEaf, error in process_files(self, tasks, nWorkers=nWorkers, threads=threads):
+                if error is not None:
+                    print('Error when processing ' + fnameEaf + ': ' + error)
+                    continue
                 nDocs += 1
-                self.lastID = int(self.eafTree.xpath('/ANNOTATION_DOCUMENT/HEADER/'
-                                                     'PROPERTY[@NAME=\'lastUsedAnnotationId\']')[0].text) + 1
-                self.transliterate()
-                self.write_output(fnameEafOut)
+                if manifest is not None:
+                    manifest.mark_done(fnameEaf, outFiles[fnameEaf])
+                    if nDocs % 100 == 0:
+                        manifest.save()
+        finally:
+            if manifest is not None:
+                manifest.save(fnamesIn=allFiles)
         print(str(nDocs) + ' documents processed.')
+        if nSkipped > 0:
+            print(str(nSkipped) + ' documents were up to date.')
+        if nDocs < len(tasks):
+            print(str(len(tasks) - nDocs) + ' documents could not be processed.')
+        stats = self.transliterator.get_stats()
+        if stats is not None:
+            report_stats(stats, os.path.join('eaf_transliterated', 'translit_stats.json'))
 
 
 if __name__ == '__main__':
     transliterator = UdmurtTransliterator(src='tatyshly_lat', target='standard',
                                           eafCleanup=True)
     ep = EafProcessor(transliterator, 'transcription')
-    ep.process_corpus()
+    ep.process_corpus(incremental=True)
@@ -1,7 +1,17 @@
 import re
+import os
 import json
-from uniparser_udmurt import UdmurtAnalyzer
 import random
+import time
+import threading
+from collections import deque
+from translit_cache import LRUCache
+from freq_index import FreqPrefixIndex
+from freq_store import FreqStore
+from verdict_store import VerdictStore
+from translit_stats import TranslitStats, sum_cache_stats
+from translit_lexicon import load_lexicons
+from translit_tables import letter_table, Rewriter, RuleCascade, RuleIndex
 
 
 class UdmurtTransliterator:
@@ -44,6 +54,12 @@ class UdmurtTransliterator:
                'ц': 'c', 'ў': 'u̯', 'х': 'x',
                'ф': 'f', 'ы': 'i̮', 'ӓ': 'ä',
                'ӱ': 'u̇', 'ң': 'ŋ', 'ӝ': 'ǯ', 'ӵ': 'č'}
+    # Letter maps compiled into str.translate tables, with upper case
+    # letters mapped to upper case replacements (cyr2dic output is
+    # always lower case)
+    dic2cyrTable = letter_table(dic2cyr)
+    cyr2dicTable = letter_table(cyr2dic, keepCase=False)
+    cyr2upaTable = letter_table(cyr2upa)
     cyrHard2Soft = {'а': 'я', 'э': 'е', 'е': 'е', 'ӥ': 'и', 'о': 'ё', 'у': 'ю'}
     rxSoften = re.compile('(?<![чӟ])ʼ([аэӥоу])', flags=re.I)
     rxCyrSoften = re.compile('([čǯ])(?!ʼ)', flags=re.I)
@@ -57,6 +73,8 @@ class UdmurtTransliterator:
     rxZh = re.compile('ж(?=[ʼяёюиеЯЁЮИЕ])')
     rxShCapital = re.compile('Ш(?=[ʼяёюиеЯЁЮИЕ])')
     rxZhCapital = re.compile('Ж(?=[ʼяёюиеЯЁЮИЕ])')
+    rxSibilantSoft = re.compile('[шжШЖ](?=[ʼяёюиеЯЁЮИЕ])')     # rxSh, rxZh and their capital versions
+    sibilantHard2Soft = {'ш': 'с', 'ж': 'з', 'Ш': 'С', 'Ж': 'З'}
     rxVJV = re.compile('(?<=[аеёиӥоӧөуыэюя])й([аэоу])', flags=re.I)
     rxSoftJV = re.compile('(?<=[^ӟчщ]ʼ)й([аэоу])', flags=re.I)
     rxJV = re.compile('\\b(?<!ʼ)й([аэоу])')
@@ -117,16 +135,146 @@ class UdmurtTransliterator:
     rxOeCyr = re.compile('ӧ⁰')
     rxOeCapitalCyr = re.compile('Ӧ⁰')
 
+    # Steps of the ambiguity expansion in transliterate_word_tatyshly_standard,
+    # in the order they are applied, together with the regexes that find
+    # the letters each step can still change
+    variantStages = [
+        ('expand_ye_variants', (rxCyrJeStart, rxCyrJeStartCapital)),
+        ('expand_dzjV_variants_start', (rxCyrDZjVStart, rxCyrDZjVStartCapital)),
+        ('expand_chV_variants', (rxCyrChV, rxCyrChVCapital)),
+        ('expand_dzjV_variants_middle', (rxCyrDZjVMiddle,)),
+        ('expand_CDzjos_variants', (rxCyrCDZjos,)),
+        ('expand_GlottalStopDzjos_variants', (rxCyrGlottalStopDZjos,)),
+        ('expand_Vjy_variants', (rxCyrJYEnd,)),
+        ('expand_ng_variants', (rxCyrNg,)),
+        ('expand_sh_variants', (rxCyrSh, rxCyrShCapital)),
+        ('expand_ch_variants', (rxCyrCh, rxCyrChCapital)),
+        ('expand_zh_variants', (rxCyrZh, rxCyrZhCapital)),
+        ('expand_cons_cluster_variants', (rxCyrConsCluster,)),
+        ('expand_ue_variants', (rxUeCyr, rxUeCyrCapital)),
+        ('expand_w_variants', (rxWCyr, rxWCyrCapital)),
+        ('expand_glottal_stop_variants', (rxGlottalStop,)),
+        ('expand_shwa_variants', (rxCyrSchwa,)),
+        ('expand_consonant_assimilation_variants', (rxCyrMM, rxCyrTT, rxCyrChCh, rxCyrDzjDzj)),
+        ('expand_final_devoicing_variants', (rxCyrFinalT, rxCyrFinalK, rxCyrFinalP))
+    ]
+    prefixMargin = 3    # Number of letters at the end of a fixed prefix that
+                        # the normalization can still change
+    beamPreselect = 20  # At most beamPreselect * beamWidth cheapest variants
+                        # are scored by frequency in beam search
+
+    # Normalization rules applied to each variant of a word after
+    # the ambiguity expansion, in the order they are applied.
+    # Each rule is (regex, method, letters): method is applied to each
+    # match of regex (or to the whole word if regex is None), and the rule
+    # is only tried if the word contains at least one of the letters.
+    normalizationRules = [
+        (rxSoften, 'soft_vowel', 'ʼ'),
+        (rxSibilantSoft, 'soft_sibilant', 'шжШЖ'),
+        (rxVJV, 'soft_vowel', 'йЙ'),
+        (rxVJV, 'soft_vowel', 'йЙ'),
+        (rxSoftJV, 'soft_vowel', 'йЙ'),
+        (rxJV, 'soft_vowel', 'й'),
+        (rxJVCapital, 'soft_vowel_upper', 'Й'),
+        (rxNeutral1, 'soft_vowel', 'эӥЭӤ'),
+        (rxNeutral2, 'neutral_i', 'ӥӤ'),
+        (rxCJV, 'separated_soft_vowel', 'йЙ'),
+        (rxCSoftJV, 'separated_soft_vowel', 'йЙ'),
+        (None, 'softSignRewriter', 'ʼ'),
+        (rxExtraSoft, 'double_letter', 'ь')
+    ]
+    # Same for Beserman text in beserman_translit_cyrillic_word
+    besermanNormalizationRules = [
+        (rxSoften, 'soft_vowel', 'ʼ'),
+        (rxSibilantSoft, 'soft_sibilant', 'шжШЖ'),
+        (rxVJV, 'soft_vowel', 'йЙ'),
+        (rxVJV, 'soft_vowel', 'йЙ'),
+        (rxJV, 'soft_vowel', 'й'),
+        (rxJVCapital, 'soft_vowel_upper', 'Й'),
+        (rxNeutral1, 'soft_vowel', 'эӥЭӤ'),
+        (rxNeutral2, 'neutral_i', 'ӥӤ'),
+        (rxCJV, 'separated_soft_vowel', 'йЙ'),
+        (None, 'softSignRewriter', 'ʼ'),
+        (rxExtraSoft, 'double_letter', 'ь')
+    ]
+
     rxUPAApos = re.compile('([źśń])', flags=re.I)
     dicUPAApos2Tatyshly = {'ź': 'z\'', 'ś': 's\'', 'ń': 'n\'',
                            'Ź': 'Z\'', 'Ś': 'S\'', 'Ń': 'N\''}
+    upa2TatyshlyTable = str.maketrans({'·': '', '·': '',    # Remove stress marks
+                                       '͕': "'", '´': "'", '́': "'",
+                                       **dicUPAApos2Tatyshly})
+
+    # Chains of literal replacements, each done in one pass
+    digraphRewriter = Rewriter({'u̯': 'w', 'U̯': 'W', 'u̇': 'ü', 'U̇': 'Ü',
+                                'ȯ': 'ö', 'Ȯ': 'Ö', 'ə̈': 'ə', 'ə̑': 'ə',
+                                'Ə̈': 'Ə', 'Ə̑': 'Ə', 'i̮': 'ɨ', 'I̮': 'Ɨ'})
+    upaRewriter = Rewriter({'ə': 'ə̑', 'Ə': 'Ə̑', 'ɤ': 'e̮', 'ɨ': 'i̮', 'Ɨ': 'I̮',
+                            'čʼ': 'č́', 'Čʼ': 'Č́', 'ǯʼ': 'ǯ́', 'Ǯʼ': 'Ǯ́', 'šʼ': 'ś',
+                            'Šʼ': 'Ś', 'žʼ': 'ź', 'Žʼ': 'Ź', 'dʼ': 'd́', 'Dʼ': 'D́',
+                            'tʼ': 't́', 'Tʼ': 'T́', 'lʼ': 'ĺ', 'Lʼ': 'Ĺ', 'nʼ': 'ń',
+                            'Nʼ': 'Ń', 'ʼ': '̓'})
+    cyrSibilantRewriter = Rewriter({'жи': 'жӥ', 'ши': 'шӥ', 'же': 'жэ', 'ше': 'шэ',
+                                    'Жи': 'Жӥ', 'Ши': 'Шӥ', 'Же': 'Жэ', 'Ше': 'Шэ'})
+    dicSoftRewriter = Rewriter({'ъʼ': 'j', 'sʼ': 'šʼ', 'zʼ': 'žʼ'})
+    softSignRewriter = Rewriter({'ӟʼ': 'ӟ', 'Ӟʼ': 'Ӟ', 'чʼ': 'ч', 'Чʼ': 'Ч', 'ʼ': 'ь'})
 
     rxCyrillic = re.compile('^[а-яёӟӥӧўөА-ЯЁӞӤӦЎӨ.,;:!?\-()\\[\\]{}<>]*$')
 
     rxWords = re.compile("[\\wʼ´́̑̈'··̯̮̇-]+|[^\\wʼ´́̑̈'··̯̮̇-]+", flags=re.DOTALL)
     rxGoodHyphenatedWord = re.compile('^\\w{3,}[^ъ.()-]-[^ьъ()-]')
 
-    def __init__(self, src, target, eafCleanup=False):
+    # Resources that are loaded on first use: {attribute: method that sets it}
+    lazyResources = {
+        'a': 'init_analyzer',
+        'cyrReplacementsBasic': 'init_cyr_replacements',
+        'rxCyrReplacementsBasic': 'init_cyr_replacements',
+        'cyrReplacementsStd': 'init_cyr_replacements',
+        'rxCyrReplacementsStd': 'init_cyr_replacements',
+        'freqDict': 'init_freq_dict',
+        'freqIndex': 'init_freq_index',
+        'verdictStore': 'init_verdict_store',
+        'lexicons': 'init_lexicons'
+    }
+    # Resources needed for each (src, target) pair
+    directionResources = {
+        ('tatyshly_lat', 'standard'): ['a', 'cyrReplacementsBasic', 'freqDict', 'freqIndex'],
+        ('tatyshly_cyr', 'standard'): ['a', 'cyrReplacementsBasic', 'freqDict', 'freqIndex']
+    }
+
+    def __init__(self, src, target, eafCleanup=False,
+                 wordCacheSize=100000,
+                 segmentCacheSize=20000,
+                 searchMode='exhaustive',
+                 maxVariants=0,
+                 wordTimeBudget=0,
+                 beamWidth=50,
+                 normalizationMode='compiled',
+                 analysisCacheSize=100000,
+                 ranking='random',
+                 verdictCacheDir=None,
+                 verdictCacheSize=2000000,
+                 collectStats=False,
+                 lexiconDir='lexicon'):
+        # One transliterator can be used from several threads:
+        # the caches have their own locks, lazy resources are loaded
+        # under resourceLock, analyzer calls are made under analyzerLock,
+        # and counters are updated under counterLock
+        self.resourceLock = threading.RLock()
+        self.analyzerLock = threading.Lock()
+        self.counterLock = threading.Lock()
+        # Constructor arguments, needed to build the same
+        # transliterator in another process
+        self.initArgs = {
+            'src': src, 'target': target, 'eafCleanup': eafCleanup,
+            'wordCacheSize': wordCacheSize, 'segmentCacheSize': segmentCacheSize,
+            'searchMode': searchMode, 'maxVariants': maxVariants,
+            'wordTimeBudget': wordTimeBudget, 'beamWidth': beamWidth,
+            'normalizationMode': normalizationMode, 'analysisCacheSize': analysisCacheSize,
+            'ranking': ranking, 'verdictCacheDir': verdictCacheDir,
+            'verdictCacheSize': verdictCacheSize, 'collectStats': collectStats,
+            'lexiconDir': lexiconDir
+        }
         self.cyrReplacements = {}
         self.srcReplacements = {}
         self.cyr2dicReplacements = {}
@@ -139,11 +287,105 @@ class UdmurtTransliterator:
         # - make sure spaces and triple dots are all right
         # - capitalize sentence-initial words and proper names
         self.eafCleanup = eafCleanup
-        self.analyzableWords = set()
-        self.PNs = set()       # Proper nouns
-        self.notPNs = set()    # Not proper nouns
+        # Results of analyzable(), including those for hyphenated words
+        self.analyzableWords = LRUCache(analysisCacheSize)
+
+        # Transliteration results, keyed by (text, src, target, eafCleanup).
+        # Size 0 switches the cache off.
+        self.wordCache = LRUCache(wordCacheSize)
+        self.segmentCache = LRUCache(segmentCacheSize)
+        # Analyzer verdicts for single words, see analysis_verdict()
+        self.analysisCache = LRUCache(analysisCacheSize)
+        # If verdictCacheDir is set, the verdicts are also stored there
+        # and reused in later runs (at most verdictCacheSize of them)
+        self.verdictCacheDir = verdictCacheDir
+        self.verdictCacheSize = verdictCacheSize
+        # Transliterations of known words compiled with translit_lexicon.py
+        # are taken from lexiconDir (if the rules and data have not changed
+        # since then); None switches the lexicons off
+        self.lexiconDir = lexiconDir
+        self.lexiconHits = 0
+        self.lexiconMisses = 0
+        # The analyzer, the replacement rules, the frequency list
+        # and the lexicons are loaded on first use, see lazyResources
+        # and warmup()
+
+        # searchMode:
+        # - exhaustive: build and normalize all variants of a word
+        # - prefix: drop partially expanded variants whose beginning
+        #   is not the beginning of any word in the frequency list
+        self.searchMode = searchMode
+        # Limits for one word: if there are more than maxVariants variants,
+        # or the expansion takes longer than wordTimeBudget seconds,
+        # only beamWidth most promising variants are kept after each step
+        # (0 means no limit)
+        self.maxVariants = maxVariants
+        self.wordTimeBudget = wordTimeBudget
+        self.beamWidth = beamWidth
+        self.nLimitedWords = 0
+        self.limitedWords = deque(maxlen=1000)  # Last words that hit one of the limits
+
+        # normalizationMode:
+        # - compiled: apply normalizationRules with skipping
+        # - sequential: apply all normalization regexes one by one
+        # - check: do both and report differences
+        self.normalizationMode = normalizationMode
+
+        # ranking (for words with no options in the frequency list):
+        # - random: take a random analyzable option
+        # - deterministic: take the first analyzable option
+        #   in the order of rank_candidates()
+        self.ranking = ranking
+        self.normalizationMismatches = []
+
+        # If collectStats is True, stage timings and other counters
+        # are collected, see get_stats()
+        self.translitStats = None
+        if collectStats:
+            self.translitStats = TranslitStats()
+        self.workerStats = {}   # {pid: counters of a worker process}, see merge_stats()
+        self.normalizer = self.compile_rules(self.normalizationRules)
+        self.besermanNormalizer = self.compile_rules(self.besermanNormalizationRules)
+
+    def __getattr__(self, name):
+        # Only called for attributes that have not been set yet
+        if name in UdmurtTransliterator.lazyResources:
+            with self.resourceLock:
+                # Another thread may have loaded it in the meantime
+                if name not in self.__dict__:
+                    getattr(self, UdmurtTransliterator.lazyResources[name])()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def init_analyzer(self):
+        from uniparser_udmurt import UdmurtAnalyzer
         self.a = UdmurtAnalyzer(mode='strict')
 
+    def init_verdict_store(self):
+        verdictStore = None
+        if self.verdictCacheDir is not None:
+            verdictStore = VerdictStore(os.path.join(self.verdictCacheDir, 'analyzer_verdicts.sqlite'),
+                                        self.analyzer_version(), maxSize=self.verdictCacheSize)
+        self.verdictStore = verdictStore
+
+    def init_lexicons(self):
+        # {(src, target, eafCleanup): {word: transliteration}}
+        self.lexicons = load_lexicons(self, self.lexiconDir)
+
+    def analyzer_version(self):
+        """
+        Return a string that identifies the analyzer and its settings.
+        Stored verdicts are only valid for the same analyzer version.
+        """
+        from importlib import metadata
+        try:
+            version = metadata.version('uniparser-udmurt')
+        except metadata.PackageNotFoundError:
+            import uniparser_udmurt
+            version = getattr(uniparser_udmurt, '__version__', 'unknown')
+        return 'uniparser-udmurt ' + version + ' strict'
+
+    def init_cyr_replacements(self):
         # Basic replacements that always have to take place
         # with Cyrillic output:
         self.cyrReplacementsBasic, self.rxCyrReplacementsBasic = self.load_replacements('data/cyr_replacements_basic_rx.csv')
@@ -151,12 +393,157 @@ class UdmurtTransliterator:
         # if complete standardization is required:
         self.cyrReplacementsStd, self.rxCyrReplacementsStd = self.load_replacements('data/cyr_replacements_std_rx.csv')
 
+    def init_freq_dict(self):
         self.freqDict = self.load_freq_list()
+
+    def init_freq_index(self):
+        # The index is only needed for pruning and beam search
+        freqIndex = None
+        if self.searchMode == 'prefix' or self.maxVariants > 0 or self.wordTimeBudget > 0:
+            freqIndex = FreqPrefixIndex(self.freqDict)
+        self.freqIndex = freqIndex
+
+    def warmup(self, src='', target='', eafCleanup=None):
+        """
+        Load all resources needed for transliteration from src to target
+        right away rather than on first use.
+        """
+        if len(src) <= 0:
+            src = self.src
+        if len(target) <= 0:
+            target = self.target
+        if eafCleanup is None:
+            eafCleanup = self.eafCleanup
+        resources = list(self.directionResources.get((src, target), []))
+        if eafCleanup:
+            resources.append('a')
+        if 'a' in resources:
+            resources.append('verdictStore')
+        resources.append('lexicons')
+        for name in resources:
+            getattr(self, name)
         print('Initialization complete.')
 
+    def compile_rules(self, rules):
+        """
+        Turn a list of rules such as normalizationRules
+        into a function that applies them to a string.
+        """
+        return RuleCascade([(rx, getattr(self, methodName), letters)
+                            for rx, methodName, letters in rules])
+
+    def soft_vowel(self, m):
+        return self.cyrHard2Soft[m.group(1).lower()]
+
+    def soft_vowel_upper(self, m):
+        return self.cyrHard2Soft[m.group(1).lower()].upper()
+
+    def separated_soft_vowel(self, m):
+        return 'ъ' + self.cyrHard2Soft[m.group(1).lower()]
+
+    def soft_sibilant(self, m):
+        return self.sibilantHard2Soft[m.group(0)]
+
+    def neutral_i(self, m):
+        return m.group(1) + 'и'
+
+    def double_letter(self, m):
+        return m.group(1) + m.group(1)
+
+    def clear_cache(self):
+        """
+        Empty word and segment caches and reset their counters.
+        """
+        self.wordCache.clear()
+        self.segmentCache.clear()
+
+    def cache_stats(self):
+        """
+        Return hit/miss counters and sizes of word, segment
+        and analyzer verdict caches.
+        """
+        stats = {
+            'word': self.wordCache.stats(),
+            'segment': self.segmentCache.stats(),
+            'analysis': self.analysisCache.stats()
+        }
+        if self.__dict__.get('verdictStore') is not None:
+            stats['verdictStore'] = self.verdictStore.stats()
+        if len(self.__dict__.get('lexicons', {})) > 0:
+            nWords = sum(len(lexicon) for lexicon in self.lexicons.values())
+            nRequests = self.lexiconHits + self.lexiconMisses
+            stats['lexicon'] = {
+                'size': nWords,
+                'maxSize': nWords,
+                'hits': self.lexiconHits,
+                'misses': self.lexiconMisses,
+                'hitRate': self.lexiconHits / nRequests if nRequests > 0 else 0.0
+            }
+        return stats
+
+    def get_stats(self):
+        """
+        Return the statistics collected with collectStats=True
+        (see translit_stats.py) together with the cache statistics,
+        including those of the worker processes, or None
+        if the statistics are not collected.
+        """
+        if self.translitStats is None:
+            return None
+        stats = self.translitStats.as_dict()
+        if len(self.workerStats) > 0:
+            # The transliterator of the main process was not used
+            stats['caches'] = sum_cache_stats([w['caches'] for w in self.workerStats.values()])
+        else:
+            stats['caches'] = sum_cache_stats([self.cache_stats()])
+        stats['limitedWords'] = self.nLimitedWords + sum(w['limitedWords']
+                                                         for w in self.workerStats.values())
+        return stats
+
+    def pop_stats(self):
+        """
+        Return the statistics collected since the previous call
+        in the form merge_stats() takes, and reset them. Used
+        to send the statistics of a worker process to the main one.
+        """
+        if self.translitStats is None:
+            return None
+        stats = {
+            'pid': os.getpid(),
+            'translit': self.translitStats.pop_dict(),
+            'caches': self.cache_stats(),
+            'limitedWords': self.nLimitedWords
+        }
+        return stats
+
+    def merge_stats(self, workerStats):
+        """
+        Add the statistics returned by pop_stats() in a worker process.
+        Cache counters are cumulative, so only the last ones are kept.
+        """
+        if self.translitStats is None or workerStats is None:
+            return
+        self.translitStats.merge(workerStats['translit'])
+        self.workerStats[workerStats['pid']] = {'caches': workerStats['caches'],
+                                                'limitedWords': workerStats['limitedWords']}
+
+    def close(self):
+        """
+        Save and close the persistent verdict cache, if there is one.
+        """
+        if 'verdictStore' in self.__dict__ and self.verdictStore is not None:
+            self.verdictStore.close()
+            del self.verdictStore
+
     def load_replacements(self, filename):
+        """
+        Load word-level replacement rules from a tab-delimited file.
+        Each rule is also applied to upper case and capitalized words.
+        Return the rules as a RuleIndex and a case-insensitive regex
+        that matches any rule.
+        """
         cyrRx = []
-        cyrReplacements = {}
+        cyrReplacements = []
         with open(filename, 'r', encoding='utf-8') as fIn:
             for line in fIn:
                 if len(line) <= 3:
@@ -165,56 +552,127 @@ class UdmurtTransliterator:
                 if len(cyrCorrect) > 0 and len(cyrSrc) > 0:
                     cyrSrc = cyrSrc.strip('^$')
                     cyrRx.append(cyrSrc)
-                    cyrReplacements[re.compile('^' + cyrSrc + '$')] = cyrCorrect
-                    cyrReplacements[re.compile('^' + cyrSrc.upper() + '$')] = cyrCorrect.upper()
-                    cyrReplacements[re.compile('^' + cyrSrc.capitalize() + '$')] = cyrCorrect.capitalize()
-        return cyrReplacements, re.compile('|'.join(r for r in sorted(cyrRx, key=lambda x: -len(x))), flags=re.I)
+                    cyrReplacements.append((cyrSrc, cyrCorrect))
+                    cyrReplacements.append((cyrSrc.upper(), cyrCorrect.upper()))
+                    cyrReplacements.append((cyrSrc.capitalize(), cyrCorrect.capitalize()))
+        return RuleIndex(cyrReplacements), re.compile('|'.join(r for r in sorted(cyrRx, key=lambda x: -len(x))), flags=re.I)
 
     def load_freq_list(self):
         """
-        Load Standard Udmurt frequency list.
+        Load Standard Udmurt frequency list. If it has been compiled
+        with freq_store.py and the compiled file is not older than
+        the JSON, it is memory-mapped instead of being read into a dict.
         """
+        fnameJson = 'data/std_freq_dict.json'
+        fnameBin = 'data/std_freq_dict.bin'
+        if os.path.exists(fnameBin) and (not os.path.exists(fnameJson)
+                                         or os.path.getmtime(fnameBin) >= os.path.getmtime(fnameJson)):
+            return FreqStore(fnameBin)
         freqDict = {}
-        with open('data/std_freq_dict.json', 'r', encoding='utf-8') as fIn:
+        with open(fnameJson, 'r', encoding='utf-8') as fIn:
             freqDict = json.load(fIn)
         return freqDict
 
+    def analysis_verdict(self, analyses):
+        """
+        Summarize the analyses of a word as a tuple
+        (has analyses, not only misspelled, only proper noun).
+        """
+        if len(analyses) <= 0 or (len(analyses) == 1 and len(analyses[0].lemma) <= 0):
+            return False, False, False
+        return (True,
+                not all(',missp' in ana.gramm for ana in analyses),
+                all(',PN' in ana.gramm for ana in analyses))
+
+    def analyze_batch(self, words, hyphenParts=False):
+        """
+        Analyze all words that have not been analyzed yet with one
+        call to the analyzer and store the results in self.analysisCache
+        (and in the persistent verdict cache, if there is one).
+        If hyphenParts is True, also analyze the parts of hyphenated words,
+        which analyzable() may need. Return a dictionary {word: verdict}
+        for the words that were not in self.analysisCache.
+        """
+        verdicts = {}
+        pending = {}
+        for word in words:
+            if word in pending or word in self.analysisCache:
+                continue
+            pending[word] = True
+            if hyphenParts and self.rxGoodHyphenatedWord.search(word) is not None:
+                for part in word.split('-'):
+                    if part not in self.analysisCache:
+                        pending[part] = True
+        if len(pending) <= 0:
+            return verdicts
+        stats = self.translitStats
+        if self.verdictStore is not None:
+            if stats is not None:
+                startTime = time.perf_counter()
+            for word, verdict in self.verdictStore.get_many(pending).items():
+                self.analysisCache.put(word, verdict)
+                verdicts[word] = verdict
+                del pending[word]
+            if stats is not None:
+                stats.add_time('verdict_store', time.perf_counter() - startTime)
+            if len(pending) <= 0:
+                return verdicts
+        pending = list(pending)
+        if stats is not None:
+            startTime = time.perf_counter()
+        newVerdicts = {}
+        with self.analyzerLock:
+            analyses = self.a.analyze_words(pending)
+        for word, analyses in zip(pending, analyses):
+            newVerdicts[word] = self.analysis_verdict(analyses)
+            self.analysisCache.put(word, newVerdicts[word])
+        if stats is not None:
+            stats.add_analyzer_call(len(pending), time.perf_counter() - startTime)
+        if self.verdictStore is not None:
+            if stats is not None:
+                startTime = time.perf_counter()
+            self.verdictStore.put_many(newVerdicts)
+            if stats is not None:
+                stats.add_time('verdict_store', time.perf_counter() - startTime)
+        verdicts.update(newVerdicts)
+        return verdicts
+
+    def get_verdict(self, word):
+        """
+        Return the analysis verdict for the word (see analysis_verdict),
+        calling the analyzer if it is not in the cache.
+        """
+        verdict = self.analysisCache.get(word)
+        while verdict is None:
+            # If another thread has analyzed the word in the meantime,
+            # analyze_batch skips it, and it is taken from the cache
+            verdict = self.analyze_batch([word]).get(word) or self.analysisCache.get(word)
+        return verdict
+
     def analyzable(self, word):
         """
         Return True iff the word can be analyzed by the Udmurt analyzer.
         """
-        if word in self.analyzableWords:
+        result = self.analyzableWords.get(word)
+        if result is not None:
             # Cache
-            return True
-        analyses = self.a.analyze_words(word)
-        if len(analyses) <= 0 or (len(analyses) == 1 and len(analyses[0].lemma) <= 0):
-            if self.rxGoodHyphenatedWord.search(word) is not None:
-                if all(self.analyzable(part) for part in word.split('-')):
-                    self.analyzableWords.add(word)
-                    return True
-            return False
-        if all(',missp' in ana.gramm for ana in analyses):
-            return False
-        self.analyzableWords.add(word)
-        return True
+            return result
+        hasAnalyses, notMissp, onlyPN = self.get_verdict(word)
+        if not hasAnalyses:
+            result = (self.rxGoodHyphenatedWord.search(word) is not None
+                      and all(self.analyzable(part) for part in word.split('-')))
+        else:
+            result = notMissp
+        self.analyzableWords.put(word, result)
+        return result
 
     def is_proper(self, word):
         """
         Return True iff the word can only be analyzed as a proper noun
         by the Udmurt analyzer.
         """
-        if word in self.PNs:
-            return True
-        elif word in self.notPNs:
-            return False
-        analyses = self.a.analyze_words(word)
-        if len(analyses) <= 0 or (len(analyses) == 1 and len(analyses[0].lemma) <= 0):
-            return False
-        if all(',PN' in ana.gramm for ana in analyses):
-            self.PNs.add(word)
-            return True
-        self.notPNs.add(word)
-        return False
+        hasAnalyses, notMissp, onlyPN = self.get_verdict(word)
+        return hasAnalyses and onlyPN
 
     def beserman_translit_cyrillic(self, text):
         """
@@ -230,18 +688,17 @@ class UdmurtTransliterator:
         if self.rxCyrillic.search(text) is not None:
             return text
 
-        letters = []
-        for letter in text:
-            if letter.lower() in self.dic2cyr:
-                if letter.islower():
-                    letters.append(self.dic2cyr[letter.lower()])
-                else:
-                    letters.append(self.dic2cyr[letter.lower()].upper())
-            else:
-                letters.append(letter)
-        res = ''.join(letters)
-        res = res.replace('h', 'х')
-        res = res.replace('H', 'Х')
+        res = text.translate(self.dic2cyrTable)
+        res = self.normalize(res, self.besermanNormalizer, self.beserman_normalize_sequential)
+
+        if res in self.cyrReplacements:
+            res = self.cyrReplacements[res]
+        return res
+
+    def beserman_normalize_sequential(self, res):
+        """
+        Apply besermanNormalizationRules one by one without skipping.
+        """
         res = self.rxSoften.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], res)
         res = self.rxSh.sub('с', res)
         res = self.rxZh.sub('з', res)
@@ -254,45 +711,15 @@ class UdmurtTransliterator:
         res = self.rxNeutral1.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], res)
         res = self.rxNeutral2.sub('\\1и', res)
         res = self.rxCJV.sub(lambda m: 'ъ' + self.cyrHard2Soft[m.group(1).lower()], res)
-        res = res.replace('ӟʼ', 'ӟ')
-        res = res.replace('Ӟʼ', 'Ӟ')
-        res = res.replace('чʼ', 'ч')
-        res = res.replace('Чʼ', 'Ч')
-        res = res.replace('ʼ', 'ь')
+        res = self.softSignRewriter(res)
         res = self.rxExtraSoft.sub('\\1\\1', res)
-
-        if res in self.cyrReplacements:
-            res = self.cyrReplacements[res]
         return res
 
     def beserman_translit_upa(self, text):
         if text in self.srcReplacements:
             text = self.srcReplacements[text]
         text = text.replace("'", 'ʼ')
-        text = text.replace('ə', 'ə̑')
-        text = text.replace('Ə', 'Ə̑')
-        text = text.replace('ɤ', 'e̮')
-        text = text.replace('ɨ', 'i̮')
-        text = text.replace('Ɨ', 'I̮')
-        # text = text.replace('w', 'u̯')
-        # text = text.replace('W', 'u̯')
-        text = text.replace('čʼ', 'č́')
-        text = text.replace('Čʼ', 'Č́')
-        text = text.replace('ǯʼ', 'ǯ́')
-        text = text.replace('Ǯʼ', 'Ǯ́')
-        text = text.replace('šʼ', 'ś')
-        text = text.replace('Šʼ', 'Ś')
-        text = text.replace('žʼ', 'ź')
-        text = text.replace('Žʼ', 'Ź')
-        text = text.replace('dʼ', 'd́')
-        text = text.replace('Dʼ', 'D́')
-        text = text.replace('tʼ', 't́')
-        text = text.replace('Tʼ', 'T́')
-        text = text.replace('lʼ', 'ĺ')
-        text = text.replace('Lʼ', 'Ĺ')
-        text = text.replace('nʼ', 'ń')
-        text = text.replace('Nʼ', 'Ń')
-        text = text.replace('ʼ', '̓')
+        text = self.upaRewriter(text)
         return text
 
     def beserman_translit_cyr2dic(self, text):
@@ -306,26 +733,11 @@ class UdmurtTransliterator:
         if text in self.cyr2dicReplacements:
             text = self.cyr2dicReplacements[text]
         text = self.rxCyrW.sub('\\1w', text)
-        text = text.replace('жи', 'жӥ')
-        text = text.replace('ши', 'шӥ')
-        text = text.replace('же', 'жэ')
-        text = text.replace('ше', 'шэ')
-        text = text.replace('Жи', 'Жӥ')
-        text = text.replace('Ши', 'Шӥ')
-        text = text.replace('Же', 'Жэ')
-        text = text.replace('Ше', 'Шэ')
-        letters = []
-        for letter in text:
-            try:
-                letters.append(self.cyr2dic[letter.lower()])
-            except KeyError:
-                letters.append(letter)
-        text = ''.join(letters)
+        text = self.cyrSibilantRewriter(text)
+        text = text.translate(self.cyr2dicTable)
         text = self.rxCyrVJV.sub('\\1j\\2', text)
         text = self.rxCyrJV.sub('j\\1', text)
-        text = text.replace('ъʼ', 'j')
-        text = text.replace('sʼ', 'šʼ')
-        text = text.replace('zʼ', 'žʼ')
+        text = self.dicSoftRewriter(text)
         text = self.rxCyrSoften.sub('\\1ʼ', text)
         text = self.rxCyrNeutral.sub('', text)
         text = self.rxCyrExtraSoft.sub('\\1ʼ\\1', text)
@@ -336,199 +748,230 @@ class UdmurtTransliterator:
         return text
 
     def upa_to_tatyshly(self, word):
-        word = word.replace('·', '')    # Remove stress marks
-        word = word.replace('·', '')    # Remove stress marks
-        word = word.replace('͕', "'")
-        word = self.rxUPAApos.sub(lambda m: self.dicUPAApos2Tatyshly[m.group(1)], word)
-        word = word.replace('´', "'")
-        word = word.replace('́', "'")
-        return word
+        return word.translate(self.upa2TatyshlyTable)
 
     def join_digraphs(self, word):
-        word = self.rxWDiacritic.sub('w', word)
-        word = self.rxWDiacriticCapital.sub('W', word)
-        word = self.rxUe.sub('ü', word)
-        word = self.rxUeCapital.sub('Ü', word)
-        word = self.rxOe.sub('ö', word)
-        word = self.rxOeCapital.sub('Ö', word)
-        word = self.rxSchwa.sub('ə', word)
-        word = self.rxSchwaCapital.sub('Ə', word)
-        word = self.rxY.sub('ɨ', word)
-        word = self.rxYCapital.sub('Ɨ', word)
-        return word
+        return self.digraphRewriter(word)
 
     def join_digraphs_cyr(self, word):
         word = self.rxOeCyr.sub('ȯ', word)
         word = self.rxOeCapitalCyr.sub('Ȯ', word)
         return word
 
-    def expand_variants(self, wordVariants, rxWhat, replacements, depth=-1):
+    def expand_variants(self, wordVariants, rxWhat, replacements, depth=-1, beam=None):
         """
         Replace each occurrence of rxWhat within each of the words
         stored in wordVariants with all options listed in replacements.
+        wordVariants is a dictionary {word: cost}, where cost is the sum
+        of the indices of the options that were used to obtain the word
+        (0 if only the first options were used).
         If depth > 0, it limits the number of iterations.
-        Return updated word list.
+        If beam is not None, it is called on the variants after each
+        iteration and can reduce their number.
+        Return updated dictionary.
         """
-        wordVariantsUpdated = []
-        prevListLen = -1
+        # Each word is only searched once; the options are substituted
+        # into the match directly and duplicates are removed by hashing.
+        successors = {}
+        # Options without group references are inserted as they are
+        literals = [None if '\\' in replacement else replacement
+                    for replacement in replacements]
         iStep = 0
-        while len(wordVariantsUpdated) != prevListLen and (depth <= 0 or iStep < depth):
-            wordVariantsUpdated = []
-            prevListLen = len(wordVariants)
-            for word in wordVariants:
-                if rxWhat.search(word) is None:
-                    if word not in wordVariantsUpdated:
-                        wordVariantsUpdated.append(word)
-                else:
-                    for replacement in replacements:
-                        wordNew = rxWhat.sub(replacement, word, count=1)
-                        if wordNew not in wordVariantsUpdated:
-                            wordVariantsUpdated.append(wordNew)
-            wordVariants = wordVariantsUpdated[:]
+        while depth <= 0 or iStep < depth:
+            prevLen = len(wordVariants)
+            wordVariantsUpdated = {}
+            for word, cost in wordVariants.items():
+                try:
+                    wordsNew = successors[word]
+                except KeyError:
+                    m = rxWhat.search(word)
+                    if m is None:
+                        wordsNew = ((word, 0),)
+                    else:
+                        wordsNew = tuple((word[:m.start()]
+                                          + (literals[iRepl] if literals[iRepl] is not None
+                                             else m.expand(replacement))
+                                          + word[m.end():], iRepl)
+                                         for iRepl, replacement in enumerate(replacements))
+                    successors[word] = wordsNew
+                for wordNew, replCost in wordsNew:
+                    if wordNew not in wordVariantsUpdated or wordVariantsUpdated[wordNew] > cost + replCost:
+                        wordVariantsUpdated[wordNew] = cost + replCost
+            beamed = False
+            if beam is not None:
+                nUpdated = len(wordVariantsUpdated)
+                wordVariantsUpdated = beam(wordVariantsUpdated)
+                beamed = len(wordVariantsUpdated) < nUpdated
+            if beamed and wordVariantsUpdated.keys() == wordVariants.keys():
+                # The beam keeps the number of variants fixed, so only
+                # stop when the variants themselves stop changing
+                break
+            wordVariants = wordVariantsUpdated
             iStep += 1
+            if not beamed and len(wordVariants) == prevLen:
+                break
         return wordVariants
 
-    def expand_ue_variants(self, wordVariants):
+    def replace_in_variants(self, wordVariants, rxWhat, replacement):
+        """
+        Make a non-ambiguous replacement in each of the words
+        stored in wordVariants. Return updated dictionary.
+        """
+        wordVariantsUpdated = {}
+        for word, cost in wordVariants.items():
+            word = rxWhat.sub(replacement, word)
+            if word not in wordVariantsUpdated or wordVariantsUpdated[word] > cost:
+                wordVariantsUpdated[word] = cost
+        return wordVariantsUpdated
+
+    def expand_ue_variants(self, wordVariants, beam=None):
         """
         Try replacing ü with u or wi.
         """
-        for i in range(len(wordVariants)):
-            wordVariants[i] = self.rxUeFinalCyr.sub('у', wordVariants[i])
-            wordVariants[i] = self.rxUeFinalCyrCapital.sub('У', wordVariants[i])
-        wordVariants = self.expand_variants(wordVariants, self.rxKUeCyr, ('ку', 'куи'))
-        for i in range(len(wordVariants)):
-            wordVariants[i] = self.rxUeCyr.sub('у', wordVariants[i])
-            wordVariants[i] = self.rxUeCyrCapital.sub('У', wordVariants[i])
-        return wordVariants
+        wordVariants = self.replace_in_variants(wordVariants, self.rxUeFinalCyr, 'у')
+        wordVariants = self.replace_in_variants(wordVariants, self.rxUeFinalCyrCapital, 'У')
+        wordVariants = self.expand_variants(wordVariants, self.rxKUeCyr, ('ку', 'куи'), beam=beam)
+        wordVariants = self.replace_in_variants(wordVariants, self.rxUeCyr, 'у')
+        return self.replace_in_variants(wordVariants, self.rxUeCyrCapital, 'У')
 
-    def expand_w_variants(self, wordVariants):
+    def expand_w_variants(self, wordVariants, beam=None):
         """
         Try replacing w with u or v.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxWCyr, ('у', 'в'))
-        return self.expand_variants(wordVariants, self.rxWCyrCapital, ('У', 'В'))
+        wordVariants = self.expand_variants(wordVariants, self.rxWCyr, ('у', 'в'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxWCyrCapital, ('У', 'В'), beam=beam)
 
-    def expand_ye_variants(self, wordVariants):
+    def expand_ye_variants(self, wordVariants, beam=None):
         """
         Try replacing je at the start with e, je or ö.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrJeStart, ('йэ', 'э', 'ӧ'))
-        return self.expand_variants(wordVariants, self.rxCyrJeStartCapital, ('Йэ', 'Э', 'Ӧ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrJeStart, ('йэ', 'э', 'ӧ'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrJeStartCapital, ('Йэ', 'Э', 'Ӧ'), beam=beam)
 
-    def expand_dzjV_variants_start(self, wordVariants):
+    def expand_dzjV_variants_start(self, wordVariants, beam=None):
         """
         Try replacing dzjV at the start with dzjV, djV or jV.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrDZjVStart, ('ӟʼ', 'дʼ', 'й'))
-        return self.expand_variants(wordVariants, self.rxCyrDZjVStartCapital, ('Ӟʼ', 'Дʼ', 'Й'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrDZjVStart, ('ӟʼ', 'дʼ', 'й'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrDZjVStartCapital, ('Ӟʼ', 'Дʼ', 'Й'), beam=beam)
 
-    def expand_dzjV_variants_middle(self, wordVariants):
+    def expand_dzjV_variants_middle(self, wordVariants, beam=None):
         """
         Try replacing dzja with dzja or dja.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrDZjVMiddle, ('ӟʼ', 'дʼ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrDZjVMiddle, ('ӟʼ', 'дʼ'), beam=beam)
         return wordVariants
 
-    def expand_CDzjos_variants(self, wordVariants):
+    def expand_CDzjos_variants(self, wordVariants, beam=None):
         """
         Try replacing Cdzjos with Cjos.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrCDZjos, ('ӟʼос', 'йос'), depth=1)
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrCDZjos, ('ӟʼос', 'йос'), depth=1, beam=beam)
         return wordVariants
 
-    def expand_GlottalStopDzjos_variants(self, wordVariants):
+    def expand_GlottalStopDzjos_variants(self, wordVariants, beam=None):
         """
         Try replacing glottal stop + dzjos with different Cjos.
         """
         wordVariants = self.expand_variants(wordVariants, self.rxCyrGlottalStopDZjos, ('ˀӟʼос', 'тйос', 'дйос',
-                                                                                       'кйос', 'гйос'), depth=1)
+                                                                                       'кйос', 'гйос'), depth=1, beam=beam)
         return wordVariants
 
-    def expand_chV_variants(self, wordVariants):
+    def expand_chV_variants(self, wordVariants, beam=None):
         """
         Try replacing cha at the start with cha or tja.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrChV, ('чʼ', 'тʼ'))
-        return self.expand_variants(wordVariants, self.rxCyrChVCapital, ('Чʼ', 'Тʼ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrChV, ('чʼ', 'тʼ'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrChVCapital, ('Чʼ', 'Тʼ'), beam=beam)
 
-    def expand_ng_variants(self, wordVariants):
+    def expand_ng_variants(self, wordVariants, beam=None):
         """
         Try replacing ŋ with n, nj or m.
         """
-        return self.expand_variants(wordVariants, self.rxCyrNg, ('н', 'нʼ', 'м'))
+        return self.expand_variants(wordVariants, self.rxCyrNg, ('н', 'нʼ', 'м'), beam=beam)
 
-    def expand_cons_cluster_variants(self, wordVariants):
+    def expand_cons_cluster_variants(self, wordVariants, beam=None):
         """
         Try inserting y in certain consonant clusters.
         """
-        return self.expand_variants(wordVariants, self.rxCyrConsCluster, ('\\1\\2', '\\1ы\\2'))
+        return self.expand_variants(wordVariants, self.rxCyrConsCluster, ('\\1\\2', '\\1ы\\2'), beam=beam)
 
-    def expand_sh_variants(self, wordVariants):
+    def expand_sh_variants(self, wordVariants, beam=None):
         """
         Try replacing sh with sh or tsh.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrSh, ('ш', 'ӵ'))
-        return self.expand_variants(wordVariants, self.rxCyrShCapital, ('Ш', 'Ӵ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrSh, ('ш', 'ӵ'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrShCapital, ('Ш', 'Ӵ'), beam=beam)
 
-    def expand_ch_variants(self, wordVariants):
+    def expand_ch_variants(self, wordVariants, beam=None):
         """
         Try replacing ch with ch or tsh.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrCh, ('чʼ', 'ӵ'))
-        return self.expand_variants(wordVariants, self.rxCyrChCapital, ('Чʼ', 'Ӵ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrCh, ('чʼ', 'ӵ'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrChCapital, ('Чʼ', 'Ӵ'), beam=beam)
 
-    def expand_zh_variants(self, wordVariants):
+    def expand_zh_variants(self, wordVariants, beam=None):
         """
         Try replacing zh with zh or dzh.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrZh, ('ж', 'ӝ'))
-        return self.expand_variants(wordVariants, self.rxCyrZhCapital, ('Ж', 'Ӝ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrZh, ('ж', 'ӝ'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrZhCapital, ('Ж', 'Ӝ'), beam=beam)
 
-    def expand_Vjy_variants(self, wordVariants):
+    def expand_Vjy_variants(self, wordVariants, beam=None):
         """
         Try removing the j between a vowel and y at the end of the word.
         """
-        return self.expand_variants(wordVariants, self.rxCyrJYEnd, ('\\1', 'й\\1'))
+        return self.expand_variants(wordVariants, self.rxCyrJYEnd, ('\\1', 'й\\1'), beam=beam)
 
-    def expand_glottal_stop_variants(self, wordVariants):
+    def expand_glottal_stop_variants(self, wordVariants, beam=None):
         """
         Try replacing glottal stop with different consonants.
         """
-        return self.expand_variants(wordVariants, self.rxGlottalStop, ('д', 'т', 'г', 'к'))
+        return self.expand_variants(wordVariants, self.rxGlottalStop, ('д', 'т', 'г', 'к'), beam=beam)
 
-    def expand_shwa_variants(self, wordVariants):
+    def expand_shwa_variants(self, wordVariants, beam=None):
         """
         Try replacing schwa with different vowels.
         """
-        return self.expand_variants(wordVariants, self.rxCyrSchwa, ('ы', 'ӥ', 'у', 'ӧ'))
+        return self.expand_variants(wordVariants, self.rxCyrSchwa, ('ы', 'ӥ', 'у', 'ӧ'), beam=beam)
 
-    def expand_consonant_assimilation_variants(self, wordVariants):
+    def expand_consonant_assimilation_variants(self, wordVariants, beam=None):
         """
         Try double consonants that may have been the result of an assimilation.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrMM, ('мм', 'нм'))
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrTT, ('тт', 'дт'))
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrChCh, ('чч', 'тч', 'дч'))
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrDzjDzj, ('ӟӟ', 'дӟ', 'тӟ'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrMM, ('мм', 'нм'), beam=beam)
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrTT, ('тт', 'дт'), beam=beam)
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrChCh, ('чч', 'тч', 'дч'), beam=beam)
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrDzjDzj, ('ӟӟ', 'дӟ', 'тӟ'), beam=beam)
         return wordVariants
 
-    def expand_final_devoicing_variants(self, wordVariants):
+    def expand_final_devoicing_variants(self, wordVariants, beam=None):
         """
         Try voicing final consonants if they are voiceless.
         """
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrFinalT, ('т\\1', 'д\\1'))
-        wordVariants = self.expand_variants(wordVariants, self.rxCyrFinalK, ('к\\1', 'г\\1'))
-        return self.expand_variants(wordVariants, self.rxCyrFinalP, ('п\\1', 'б\\1'))
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrFinalT, ('т\\1', 'д\\1'), beam=beam)
+        wordVariants = self.expand_variants(wordVariants, self.rxCyrFinalK, ('к\\1', 'г\\1'), beam=beam)
+        return self.expand_variants(wordVariants, self.rxCyrFinalP, ('п\\1', 'б\\1'), beam=beam)
 
-    def pick_best(self, words):
+    def pick_best(self, words, costs=None):
         """
         Choose the most probable replacement out of several options
-        based on frequency.
+        based on frequency. costs is a dictionary {word: cost} with
+        the sums of the indices of the alternatives used to obtain
+        the options; it is only used in the deterministic ranking mode.
         """
         if len(words) <= 0:
             return ''
         elif len(words) == 1:
             return words[0]
+        if self.ranking == 'deterministic':
+            rankedWords = self.rank_candidates(words, costs)
+            if rankedWords[0].lower() in self.freqDict:
+                return rankedWords[0]
+            for word in rankedWords:
+                if self.analyzable(word):
+                    return word
+            return rankedWords[0]
         bestWord = words[0]
         maxFreq = -1
         for word in words:
@@ -540,87 +983,283 @@ class UdmurtTransliterator:
                     maxFreq = curFreq
         if maxFreq == -1:
             # Couldn't find any word in the frequency dictionary
+            # The list of the caller is not changed
+            words = list(words)
             random.shuffle(words)
             for word in words:
                 if self.analyzable(word):
                     return word
         return bestWord
 
+    def rank_candidates(self, words, costs=None):
+        """
+        Sort the options from the most to the least probable one:
+        by frequency, then by the cost of the alternatives used
+        to obtain them, then alphabetically.
+        """
+        if costs is None:
+            costs = {}
+        return sorted(words, key=lambda w: (-self.freqDict.get(w.lower(), -1), costs.get(w, 0), w))
+
+    def prefetch_candidates(self, wordCandidates):
+        """
+        Analyze the options that pick_best will have to check for
+        several words at once. wordCandidates is a list of dictionaries
+        {option: cost}. In the deterministic ranking mode, only the
+        most probable options are analyzed first, and less probable
+        ones only for the words where none of them was analyzable.
+        """
+        unresolved = [candidates for candidates in wordCandidates
+                      if len(candidates) > 1
+                      and not any(w.lower() in self.freqDict for w in candidates)]
+        if self.ranking != 'deterministic':
+            self.analyze_batch([w for candidates in unresolved for w in candidates],
+                               hyphenParts=True)
+            return
+        unresolved = [self.rank_candidates(list(candidates), candidates) for candidates in unresolved]
+        iStart = 0
+        nWords = 1
+        while len(unresolved) > 0:
+            self.analyze_batch([w for rankedWords in unresolved for w in rankedWords[iStart:iStart + nWords]],
+                               hyphenParts=True)
+            unresolved = [rankedWords for rankedWords in unresolved
+                          if len(rankedWords) > iStart + nWords
+                          and not any(self.analyzable(w) for w in rankedWords[iStart:iStart + nWords])]
+            iStart += nWords
+            nWords *= 4
+
     def transliterate_word_tatyshly_standard(self, word, finalDevoicing=True):
-        if self.rxCyrillic.search(word) is not None:
-            return word
+        candidates = self.candidates_tatyshly_standard(word, finalDevoicing=finalDevoicing)
+        return self.pick_best(list(candidates), candidates)
+
+    def tatyshly_to_cyr(self, word):
+        """
+        Convert a Tatyshly word into the Cyrillic spelling
+        that the ambiguity expansion starts from.
+        """
         word = self.upa_to_tatyshly(word)
         word = self.join_digraphs(word)
+        word = word.translate(self.dic2cyrTable)
+        return word.replace("'", 'ʼ')
 
-        letters = []
-        for letter in word:
-            if letter.lower() in self.dic2cyr:
-                if letter.islower():
-                    letters.append(self.dic2cyr[letter.lower()])
-                else:
-                    letters.append(self.dic2cyr[letter.lower()].upper())
-            else:
-                letters.append(letter)
-        word = ''.join(letters)
-        word = word.replace("'", 'ʼ')
+    def candidates_tatyshly_standard(self, word, finalDevoicing=True):
+        """
+        Return the Standard Udmurt words that a Tatyshly word
+        could correspond to as a dictionary {candidate: cost}.
+        """
+        if self.rxCyrillic.search(word) is not None:
+            return {word: 0}
+        word = self.tatyshly_to_cyr(word)
 
         # Some replacements are ambiguous
-        wordVariants = [word]
-        wordVariants = self.expand_ye_variants(wordVariants)
-        wordVariants = self.expand_dzjV_variants_start(wordVariants)
-        wordVariants = self.expand_chV_variants(wordVariants)
-        wordVariants = self.expand_dzjV_variants_middle(wordVariants)
-        wordVariants = self.expand_CDzjos_variants(wordVariants)
-        wordVariants = self.expand_GlottalStopDzjos_variants(wordVariants)
-        wordVariants = self.expand_Vjy_variants(wordVariants)
-        wordVariants = self.expand_ng_variants(wordVariants)
-        wordVariants = self.expand_sh_variants(wordVariants)
-        wordVariants = self.expand_ch_variants(wordVariants)
-        wordVariants = self.expand_zh_variants(wordVariants)
-        wordVariants = self.expand_cons_cluster_variants(wordVariants)
-        wordVariants = self.expand_ue_variants(wordVariants)
-        wordVariants = self.expand_w_variants(wordVariants)
-        wordVariants = self.expand_glottal_stop_variants(wordVariants)
-        wordVariants = self.expand_shwa_variants(wordVariants)
-        wordVariants = self.expand_consonant_assimilation_variants(wordVariants)
-        if finalDevoicing:
-            wordVariants = self.expand_final_devoicing_variants(wordVariants)
+        stages = [stage for stage in self.variantStages
+                  if finalDevoicing or stage[0] != 'expand_final_devoicing_variants']
+        # The variant and time limits are shared by all searches for this word
+        limits = {'startTime': time.monotonic(), 'limited': False}
+        if self.searchMode == 'prefix':
+            candidates = self.expand_and_normalize(word, stages, limits, prune=True)
+            if any(w.lower() in self.freqDict for w in candidates):
+                return candidates
+            # Nothing attested survived: fall back to the exhaustive search
+        candidates = self.expand_and_normalize(word, stages, limits)
+        return candidates
+
+    def expand_and_normalize(self, word, stages, limits, prune=False):
+        """
+        Expand all ambiguous letters in a word, applying the expansion
+        steps listed in stages, and normalize the resulting variants.
+        If prune is True, drop variants that cannot lead to a word
+        in the frequency list after each step. If the word exceeds
+        the variant or time limits, switch to beam search; limits
+        is a dictionary with the start time of the search and a flag
+        telling if the limits have already been hit.
+        Return a dictionary {candidate: cost}.
+        """
+        stats = self.translitStats
+        if stats is not None:
+            startTime = time.perf_counter()
+        wordVariants = {word: 0}
+        prefixCache = {}
+        for iStage in range(len(stages)):
+            beam = None
+            if self.maxVariants > 0 or self.wordTimeBudget > 0:
+                beam = self.make_beam(word, stages[iStage:], prefixCache, limits)
+            wordVariants = getattr(self, stages[iStage][0])(wordVariants, beam=beam)
+            if prune and len(wordVariants) > 1:
+                wordVariants = self.prune_variants(wordVariants, stages[iStage + 1:], prefixCache)
         # print(wordVariants)
+        if stats is not None:
+            stats.add_time('expansion', time.perf_counter() - startTime)
+            stats.add_variants(len(wordVariants))
+            return self.normalize_variants_timed(wordVariants)
+
+        candidates = {}
+        for w, cost in wordVariants.items():
+            w = self.apply_cyr_replacements(self.normalize_variant(w))
+            if w not in candidates or candidates[w] > cost:
+                candidates[w] = cost
+        return candidates
+
+    def normalize_variants_timed(self, wordVariants):
+        """
+        Same as the end of expand_and_normalize(), but also measure
+        the time spent on normalization and on replacements.
+        """
+        candidates = {}
+        timeNormalization = 0.0
+        timeReplacements = 0.0
+        for w, cost in wordVariants.items():
+            t0 = time.perf_counter()
+            w = self.normalize_variant(w)
+            t1 = time.perf_counter()
+            w = self.apply_cyr_replacements(w)
+            timeNormalization += t1 - t0
+            timeReplacements += time.perf_counter() - t1
+            if w not in candidates or candidates[w] > cost:
+                candidates[w] = cost
+        self.translitStats.add_time('normalization', timeNormalization, len(wordVariants))
+        self.translitStats.add_time('cyr_replacements', timeReplacements, len(wordVariants))
+        return candidates
+
+    def make_beam(self, word, stagesLeft, prefixCache, limits):
+        """
+        Return a function that checks the variant and time limits
+        for the word being expanded and, once one of them has been hit,
+        reduces the variants to the beamWidth most promising ones.
+        The limits are checked after each iteration of an expansion step.
+        """
+        def beam(wordVariants):
+            if not limits['limited']:
+                if not self.limit_exceeded(len(wordVariants), limits['startTime']):
+                    return wordVariants
+                limits['limited'] = True
+                with self.counterLock:
+                    self.nLimitedWords += 1
+                self.limitedWords.append(word)
+            if len(wordVariants) <= self.beamWidth:
+                return wordVariants
+            return self.beam_variants(wordVariants, stagesLeft, prefixCache)
+        return beam
+
+    def limit_exceeded(self, nVariants, startTime):
+        """
+        Check if the expansion of the current word has exceeded
+        the maximal number of variants or the time budget.
+        """
+        if 0 < self.maxVariants < nVariants:
+            return True
+        if self.wordTimeBudget > 0 and time.monotonic() - startTime > self.wordTimeBudget:
+            return True
+        return False
 
-        for i in range(len(wordVariants)):
-            w = wordVariants[i]
-            w = self.rxSoften.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxSh.sub('с', w)
-            w = self.rxZh.sub('з', w)
-            w = self.rxShCapital.sub('С', w)
-            w = self.rxZhCapital.sub('З', w)
-            w = self.rxVJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxVJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxSoftJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxJVCapital.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()].upper(), w)
-            w = self.rxNeutral1.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxNeutral2.sub('\\1и', w)
-            w = self.rxCJV.sub(lambda m: 'ъ' + self.cyrHard2Soft[m.group(1).lower()], w)
-            w = self.rxCSoftJV.sub(lambda m: 'ъ' + self.cyrHard2Soft[m.group(1).lower()], w)
-            w = w.replace('ӟʼ', 'ӟ')
-            w = w.replace('Ӟʼ', 'Ӟ')
-            w = w.replace('чʼ', 'ч')
-            w = w.replace('Чʼ', 'Ч')
-            w = w.replace('ʼ', 'ь')
-            w = self.rxExtraSoft.sub('\\1\\1', w)
-
-            if self.rxCyrReplacementsBasic.search(w) is not None:
-                for rxSrc, replacement in self.cyrReplacementsBasic.items():
-                    w = rxSrc.sub(replacement, w)
-            if self.rxCyrReplacementsStd.search(w) is not None:
-                for rxSrc, replacement in self.cyrReplacementsStd.items():
-                    w = rxSrc.sub(replacement, w)
-
-            wordVariants[i] = w
+    def fixed_prefix(self, word, stagesLeft, prefixCache):
+        """
+        Find the part of a partially expanded variant that stagesLeft
+        cannot change anymore and normalize it. Return a tuple
+        (prefix, rewritable): prefix is lowercased and has its last
+        letters, which the normalization could still change, cut off;
+        rewritable is True if a replacement rule matches the prefix.
+        """
+        fixedLen = len(word)
+        for methodName, rxSites in stagesLeft:
+            for rxSite in rxSites:
+                m = rxSite.search(word)
+                if m is not None and m.start() < fixedLen:
+                    fixedLen = m.start()
+        fixedPart = word[:fixedLen]
+        if fixedPart not in prefixCache:
+            prefix = self.normalize_variant(fixedPart)
+            rewritable = (self.rxCyrReplacementsBasic.search(prefix) is not None
+                          or self.rxCyrReplacementsStd.search(prefix) is not None)
+            if fixedLen < len(word):
+                prefix = prefix[:-self.prefixMargin]
+            prefixCache[fixedPart] = (prefix.lower(), rewritable)
+        return prefixCache[fixedPart]
+
+    def prune_variants(self, wordVariants, stagesLeft, prefixCache):
+        """
+        Remove partially expanded variants whose fixed part, i.e. the part
+        before the first letter that stagesLeft can still change,
+        does not start any word in the frequency list after normalization.
+        Return updated dictionary.
+        """
+        wordVariantsPruned = {}
+        for word, cost in wordVariants.items():
+            prefix, rewritable = self.fixed_prefix(word, stagesLeft, prefixCache)
+            # Replacement rules can rewrite the whole word, so
+            # such variants are always kept
+            if rewritable or self.freqIndex.has_prefix(prefix):
+                wordVariantsPruned[word] = cost
+        return wordVariantsPruned
+
+    def beam_variants(self, wordVariants, stagesLeft, prefixCache):
+        """
+        Keep only self.beamWidth variants whose fixed parts start the most
+        frequent words in the frequency list; ties are resolved by cost.
+        If there are too many variants, only the cheapest ones are scored.
+        Return updated dictionary.
+        """
+        words = list(wordVariants)
+        if len(words) > self.beamWidth * self.beamPreselect:
+            words = sorted(words, key=lambda w: wordVariants[w])[:self.beamWidth * self.beamPreselect]
+        scores = {word: self.freqIndex.max_freq(self.fixed_prefix(word, stagesLeft, prefixCache)[0])
+                  for word in words}
+        bestWords = set(sorted(words, key=lambda w: (-scores[w], wordVariants[w]))[:self.beamWidth])
+        return {word: cost for word, cost in wordVariants.items() if word in bestWords}
+
+    def normalize_variant(self, w):
+        """
+        Turn one variant of a word into a well-formed
+        Standard Udmurt Cyrillic string.
+        """
+        return self.normalize(w, self.normalizer, self.normalize_variant_sequential)
 
-        # print(wordVariants)
-        return self.pick_best(wordVariants)
+    def normalize_variant_sequential(self, w):
+        """
+        Apply normalizationRules one by one without skipping.
+        """
+        w = self.rxSoften.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxSh.sub('с', w)
+        w = self.rxZh.sub('з', w)
+        w = self.rxShCapital.sub('С', w)
+        w = self.rxZhCapital.sub('З', w)
+        w = self.rxVJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxVJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxSoftJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxJV.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxJVCapital.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()].upper(), w)
+        w = self.rxNeutral1.sub(lambda m: self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxNeutral2.sub('\\1и', w)
+        w = self.rxCJV.sub(lambda m: 'ъ' + self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.rxCSoftJV.sub(lambda m: 'ъ' + self.cyrHard2Soft[m.group(1).lower()], w)
+        w = self.softSignRewriter(w)
+        w = self.rxExtraSoft.sub('\\1\\1', w)
+        return w
+
+    def normalize(self, w, normalizer, normalizerSequential):
+        """
+        Normalize a string with the compiled rules, the sequential
+        pipeline or both, depending on self.normalizationMode.
+        In the check mode, store the strings for which the results
+        differ and return the result of the sequential pipeline.
+        """
+        if self.normalizationMode == 'compiled':
+            return normalizer(w)
+        elif self.normalizationMode == 'sequential':
+            return normalizerSequential(w)
+        res = normalizer(w)
+        resSequential = normalizerSequential(w)
+        if res != resSequential:
+            print('Normalization mismatch: ' + w + ' -> ' + res + ' (expected: ' + resSequential + ')')
+            self.normalizationMismatches.append((w, res, resSequential))
+        return resSequential
+
+    def apply_cyr_replacements(self, w):
+        """
+        Apply word-level replacements from data/cyr_replacements_*.csv.
+        """
+        w = self.cyrReplacementsBasic.apply(w)
+        return self.cyrReplacementsStd.apply(w)
 
     def transliterate_word_cyrtrans_upa(self, word):
         """
@@ -629,71 +1268,52 @@ class UdmurtTransliterator:
         # if self.rxCyrillic.search(word) is None:
         #     return word
         word = self.join_digraphs_cyr(word)
-
-        letters = []
-        for letter in word:
-            if letter.lower() in self.cyr2upa:
-                if letter.islower():
-                    letters.append(self.cyr2upa[letter.lower()])
-                else:
-                    letters.append(self.cyr2upa[letter.lower()].upper())
-            else:
-                letters.append(letter)
-        word = ''.join(letters)
-        return word
+        return word.translate(self.cyr2upaTable)
 
     def transliterate_word(self, word, src='', target='', eafCleanup=None):
         """
         Return transliterated word, taking into account
         src, target and other parameters.
         """
-        # Use default values if none are provided
-        if len(src) <= 0:
-            src = self.src
-        if len(target) <= 0:
-            target = self.target
-        if eafCleanup is None:
-            eafCleanup = self.eafCleanup
+        return self.transliterate_words([word], src=src, target=target, eafCleanup=eafCleanup)[word]
 
+    def word_candidates(self, word, src, target):
+        """
+        Return the possible transliterations of a word as a dictionary
+        {option: cost}; pick_best chooses one of them.
+        """
         # Lots of cases
         if src == 'tatyshly_lat':
             if target == 'standard':
-                word = self.transliterate_word_tatyshly_standard(word)
+                return self.candidates_tatyshly_standard(word)
         elif src == 'tatyshly_cyr':
             if target == 'standard':
                 wordUpa = self.transliterate_word_cyrtrans_upa(word)
-                word = self.transliterate_word_tatyshly_standard(wordUpa, finalDevoicing=True)
-
-        if eafCleanup:
-            if self.is_proper(word):
-                word = self.rxLetter.sub(lambda m: m.group(1).upper(), word, count=1)
+                return self.candidates_tatyshly_standard(wordUpa, finalDevoicing=True)
+        return {word: 0}
 
+    def capitalize_proper(self, word):
+        """
+        Capitalize the word if it is a proper noun.
+        """
+        if self.is_proper(word):
+            word = self.rxLetter.sub(lambda m: m.group(1).upper(), word, count=1)
         return word
 
-    def transliterate(self, text, src='', target='', eafCleanup=None):
+    def split_text(self, text, eafCleanup):
         """
-        Return transliterated string, taking into account
-        src, target and other parameters.
+        Clean up the text if needed and split it into words
+        and the strings between them.
         """
-        # Use default values if none are provided
-        if len(src) <= 0:
-            src = self.src
-        if len(target) <= 0:
-            target = self.target
-        if eafCleanup is None:
-            eafCleanup = self.eafCleanup
-
         if eafCleanup:
             text = self.rxDots.sub('... ', text)
             text = self.rxSpaces.sub(' ', text).strip()
+        return self.rxWords.findall(text)
 
-        parts = self.rxWords.findall(text)
-        text = ''.join(self.transliterate_word(part,
-                                               src=src,
-                                               target=target,
-                                               eafCleanup=eafCleanup)
-                       for part in parts)
-
+    def finalize_text(self, text, eafCleanup):
+        """
+        Clean up the transliterated text if needed.
+        """
         if eafCleanup:
             text = self.rxNrzb.sub('[нрзб]', text)
             text = self.rxLetter.sub(lambda m: m.group(1).upper(), text, count=1)
@@ -707,6 +1327,116 @@ class UdmurtTransliterator:
             #     text = self.rxQ.sub(' a', text)
         return text
 
+    def transliterate(self, text, src='', target='', eafCleanup=None):
+        """
+        Return transliterated string, taking into account
+        src, target and other parameters.
+        """
+        return self.transliterate_many([text], src=src, target=target, eafCleanup=eafCleanup)[0]
+
+    def transliterate_words(self, words, src='', target='', eafCleanup=None):
+        """
+        Return a dictionary {word: transliteration} for a list of
+        distinct words. Words found in the compiled lexicon for this
+        direction (see translit_lexicon.py) are taken from it.
+        """
+        # Use default values if none are provided
+        if len(src) <= 0:
+            src = self.src
+        if len(target) <= 0:
+            target = self.target
+        if eafCleanup is None:
+            eafCleanup = self.eafCleanup
+
+        # Words are transliterated in three steps, so that the analyzer
+        # is called once for all candidates and once for all proper
+        # noun checks
+        wordsTranslit = {}
+        wordCandidates = {}
+        lexicon = self.lexicons.get((src, target, eafCleanup))
+        stats = self.translitStats
+        wordTimes = {}      # {word: (seconds, variants)}, if stats are collected
+        nLexiconHits = 0
+        for part in words:
+            if lexicon is not None:
+                translit = lexicon.get(part)
+                if translit is not None:
+                    wordsTranslit[part] = translit
+                    nLexiconHits += 1
+                    continue
+            cached = self.wordCache.get((part, src, target, eafCleanup))
+            if cached is not None:
+                wordsTranslit[part] = cached
+            elif stats is None:
+                wordCandidates[part] = self.word_candidates(part, src, target)
+            else:
+                startTime = time.perf_counter()
+                wordCandidates[part] = self.word_candidates(part, src, target)
+                wordTimes[part] = (time.perf_counter() - startTime, stats.take_variants())
+        if lexicon is not None:
+            with self.counterLock:
+                self.lexiconHits += nLexiconHits
+                self.lexiconMisses += len(words) - nLexiconHits
+        if stats is None:
+            self.prefetch_candidates(list(wordCandidates.values()))
+            for part, candidates in wordCandidates.items():
+                wordsTranslit[part] = self.pick_best(list(candidates), candidates)
+        else:
+            start = stats.timer()
+            self.prefetch_candidates(list(wordCandidates.values()))
+            stats.add_time_since('freq_lookup', start)
+            for part, candidates in wordCandidates.items():
+                start = stats.timer()
+                wordsTranslit[part] = self.pick_best(list(candidates), candidates)
+                seconds = stats.add_time_since('freq_lookup', start)
+                stats.add_word(part, wordTimes[part][0] + seconds, wordTimes[part][1])
+        if eafCleanup:
+            self.analyze_batch([wordsTranslit[part] for part in wordCandidates])
+            for part in wordCandidates:
+                wordsTranslit[part] = self.capitalize_proper(wordsTranslit[part])
+        for part in wordCandidates:
+            self.wordCache.put((part, src, target, eafCleanup), wordsTranslit[part])
+        return wordsTranslit
+
+    def transliterate_many(self, texts, src='', target='', eafCleanup=None):
+        """
+        Return the list of transliterations of the strings in texts.
+        Each distinct word form occurring in them is transliterated once.
+        """
+        # Use default values if none are provided
+        if len(src) <= 0:
+            src = self.src
+        if len(target) <= 0:
+            target = self.target
+        if eafCleanup is None:
+            eafCleanup = self.eafCleanup
+
+        results = [None] * len(texts)
+        textParts = {}      # {text: its parts}, for texts not in the cache
+        for iText, text in enumerate(texts):
+            if text in textParts:
+                continue
+            cached = self.segmentCache.get((text, src, target, eafCleanup))
+            if cached is not None:
+                results[iText] = cached
+            else:
+                textParts[text] = self.split_text(text, eafCleanup)
+
+        words = {}
+        for parts in textParts.values():
+            for part in parts:
+                words[part] = True
+        wordsTranslit = self.transliterate_words(list(words), src=src, target=target, eafCleanup=eafCleanup)
+
+        textsTranslit = {}
+        for text, parts in textParts.items():
+            textsTranslit[text] = self.finalize_text(''.join(wordsTranslit[part] for part in parts),
+                                                     eafCleanup)
+            self.segmentCache.put((text, src, target, eafCleanup), textsTranslit[text])
+        for iText in range(len(texts)):
+            if results[iText] is None:
+                results[iText] = textsTranslit[texts[iText]]
+        return results
 
 if __name__ == '__main__':
     bt = UdmurtTransliterator(src='tatyshly_lat',
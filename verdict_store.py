@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+
+
+class VerdictStore:
+    """
+    Analyzer verdicts (see UdmurtTransliterator.analysis_verdict)
+    kept in an SQLite file, so that they survive between runs.
+    Each verdict is stored together with the analyzer version;
+    verdicts of other versions are deleted when the file is opened.
+    If there are more than maxSize verdicts, the oldest ones are removed
+    (this is checked after every 1000 or maxSize / 100 new verdicts).
+    Several processes can use the same file, and several threads
+    the same VerdictStore.
+    """
+    chunkSize = 500     # Words per query
+
+    def __init__(self, fname, version, maxSize=2000000):
+        self.fname = fname
+        self.version = version
+        self.maxSize = maxSize      # Negative values mean no limit
+        dirName = os.path.dirname(fname)
+        if len(dirName) > 0 and not os.path.exists(dirName):
+            os.makedirs(dirName, exist_ok=True)
+        self.conn = sqlite3.connect(fname, timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS verdicts '
+                          '(version TEXT, word TEXT, verdict INTEGER, '
+                          'UNIQUE (version, word))')
+        self.conn.execute('DELETE FROM verdicts WHERE version != ?', (self.version,))
+        self.conn.commit()
+        self.nWritten = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def encode(verdict):
+        return sum(1 << i for i in range(3) if verdict[i])
+
+    @staticmethod
+    def decode(code):
+        return tuple(bool(code & (1 << i)) for i in range(3))
+
+    def get_many(self, words):
+        """
+        Return a dictionary {word: verdict} for the words that
+        have stored verdicts.
+        """
+        words = list(words)
+        verdicts = {}
+        with self.lock:
+            for i in range(0, len(words), self.chunkSize):
+                chunk = words[i:i + self.chunkSize]
+                rows = self.conn.execute('SELECT word, verdict FROM verdicts WHERE version = ? '
+                                         'AND word IN (' + ','.join('?' * len(chunk)) + ')',
+                                         [self.version] + chunk)
+                for word, code in rows:
+                    verdicts[word] = self.decode(code)
+            self.hits += len(verdicts)
+            self.misses += len(words) - len(verdicts)
+        return verdicts
+
+    def put_many(self, verdicts):
+        """
+        Store verdicts, a dictionary {word: verdict}.
+        """
+        if len(verdicts) <= 0:
+            return
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO verdicts (version, word, verdict) VALUES (?, ?, ?)',
+                                  [(self.version, word, self.encode(verdict))
+                                   for word, verdict in verdicts.items()])
+            self.nWritten += len(verdicts)
+            if self.maxSize >= 0 and self.nWritten >= max(1000, self.maxSize // 100):
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        """
+        Remove the oldest verdicts if there are more than maxSize of them.
+        """
+        self.nWritten = 0
+        nVerdicts = self.conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        if nVerdicts > self.maxSize:
+            self.conn.execute('DELETE FROM verdicts WHERE rowid IN '
+                              '(SELECT rowid FROM verdicts ORDER BY rowid LIMIT ?)',
+                              (nVerdicts - self.maxSize,))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+    def stats(self):
+        size = len(self)
+        nRequests = self.hits + self.misses
+        return {
+            'size': size,
+            'maxSize': self.maxSize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / nRequests if nRequests > 0 else 0.0
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()